@@ -1,18 +1,23 @@
 # make a dashboard to make user investment plan
 # Import libraries
 import pandas as pd
+import numpy as np
 import dash
 from dash import html, dcc, dash_table
 from dash.dash_table.Format import Format, Scheme
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ClientsideFunction
 import plotly.express as px
 import plotly.graph_objects as go
 import dash_bootstrap_components as dbc
 import gunicorn
 import investment_functions as inv
+import metrics
+from cache_warmer import CacheWarmer
+from job_queue import ProjectionJobManager
 import yfinance as yf
 from datetime import date
 import functools
+import os
 
 # Create a dash application
 app = dash.Dash(__name__, 
@@ -20,6 +25,9 @@ app = dash.Dash(__name__,
                 meta_tags=[{"name":"viewport","content":"width=device-width, initial-scale=1.0,maximim-scale=1.2,minimum-scale=0.5"}])
 app.title = 'Investment Strategy'                               # change the name of the application
 server = app.server
+# serve the timing and cache metrics at /metrics
+if metrics.enabled:
+    metrics.register(server)
 
 # dashboard instructions markdown text
 instructions_text = '''**Current Investments Table:**    
@@ -61,8 +69,23 @@ portfolio = pd.DataFrame({
     'future_percents':[30,25,25,5,5,5,5]
 })
 
-# global variable to keep track of clicks on the data table adding rows
-n_old = 0
+# load the starter tickers and the most requested tickers into the cache in the background, then refresh them after every market close
+# the request counts are kept next to the shared cache so every worker and restart knows which tickers are popular
+shared_dir = os.environ.get('PRICE_CACHE_DIR') or os.environ.get('PRICE_STORE_DIR')
+warmer = CacheWarmer(inv.prefetch, portfolio['ticker'],
+                     Top_n = int(os.environ.get('WARM_TOP_TICKERS', 20)),
+                     Popular_file = os.environ.get('POPULAR_TICKERS_FILE') or (os.path.join(shared_dir, 'popular_tickers.json') if shared_dir else None))
+warmer.register(server)
+if os.environ.get('CACHE_WARMER_ENABLED', '1') != '0':
+    warmer.start()
+else:
+    warmer.ready.set()
+
+# number of processes to split the monte carlo simulation across
+simulation_processes = int(os.environ.get('SIMULATION_PROCESSES', 1))
+
+# run the Submit callback as a background job so long projections don't run into the request timeout, set JOB_CACHE_DIR to turn it on
+job_manager = ProjectionJobManager(os.environ['JOB_CACHE_DIR']) if os.environ.get('JOB_CACHE_DIR') else None
 
 # markdown style
 markdown_style = {'text-align':'left','color': '#373F27','font-size':20,'font_family': 'Verdana','backgroundColor': '#FFFFFF', 'padding':'5px'}
@@ -116,11 +139,28 @@ app.layout = html.Div([
             dbc.Col(html.P("Number of Years Plan to Invest:", style = p_style)),
             dbc.Col(dcc.Input(id='years_to_invest',type="number",placeholder="Years to Invest", min=0, style=input_style)),
         ]),
+        dbc.Row([
+            # choose to also simulate the range of outcomes
+            dbc.Col(html.P("Show Range of Outcomes:", style = p_style)),
+            dbc.Col(dcc.Checklist(id='simulation-mode', options=[{'label':' Monte Carlo simulation (5th to 95th percentile)', 'value':'monte-carlo'}],
+                                  value=[], style=input_style)),
+        ]),
         dbc.Row([
             # add a button that tracks the number of clicks
             dbc.Col(),
             dbc.Col(html.Button('Submit', id='submit-val', n_clicks=0)),
         ]),
+        dbc.Row([
+            # progress of the background job and a button to stop it, only shown while the job runs
+            dbc.Col(dbc.Progress(id='job-progress', value=0, label='', striped=True, animated=True, style={'display':'none'})),
+            dbc.Col(html.Button('Cancel', id='cancel-val', n_clicks=0, style={'display':'none'})),
+        ]),
+    ]),
+    # quick preview of the growth that updates as the inputs change, made in the browser from the statistics of each ticker
+    html.Div([
+        dcc.Graph(id = 'preview-graph'),
+        dcc.Store(id = 'table-tickers'),
+        dcc.Store(id = 'ticker-stats'),
     ]),
     html.Div([
             # print the total amount of money the user invested
@@ -131,86 +171,50 @@ app.layout = html.Div([
     # scatter plot of selection from drop down menu
     html.Div([
         dcc.Graph(id = 'predictions-graph'),
+        # heatmap of the predicted worth for other monthly investments and years
+        dcc.Graph(id = 'sweep-graph'),
         dcc.Markdown(children = notes_text, style = markdown_style),
     ]),
 
 ])
 
-# callback and function to add rows to the datatable and to update the quantity column
-@app.callback(Output('user-input', 'data'),
-              Input('user-input','data_timestamp'),
-              Input('editing-rows-button', 'n_clicks'),
-              State('user-input', 'data'))
-def update_row(timestamp, n_clicks, rows):
-    # decale n_old as a global variable
-    global n_old
-    # determine if the n_clicks is above zero and has changed 
-    if n_clicks > 0 and n_clicks>n_old:
-        # add a new row to the table
-        rows.append({'ticker':'','quantity':0,'future_percents':0,'percent':0,'editable':True,'deletable':True})
-        # increment n_old
-        n_old = n_old+1
-    # try to find the percent of current portfolio each investment has
-    try:
-        list = []                                       # create a new list
-        for row in rows:                                # add all of the quantities to that list
-            list.append(row['quantity'])
-        total = sum(list)                               # sum those quantities
-        for row in rows:                                # calculate the percent for each row
-            quantity = float(row['quantity'])
-            row['percent'] = (quantity/total)*100 
-    except:                                             # if the percent cannot be found give an error
-        print('Error')
-    return rows
-
-# callback and funtion to make the pie chart of the users current investment distributions
-@app.callback(Output('investment-distribution','figure'),
-              Input('user-input','data'))
-def pieUserInvest (rows):
-    # make the user date into a dataframe
-    df = pd.DataFrame(rows)  
-    # make a pie chart of the users investment distribution   
-    fig1 = px.pie(df, values=df['percent'], names=df['ticker'], color_discrete_sequence=px.colors.sequential.speed)
-    fig1.update_layout(plot_bgcolor = '#D5D5D5')
-    fig1.update_layout(title="User Investment Strategy",title_font=dict(size=20, color='#373F27', family = 'Verdana'))
-    fig1.update_traces(marker=dict(line=dict(color='#373737', width=1)))
-    return fig1
-
-# callback and function to get the predicted value of the invests, basically using our functions we made
-@app.callback(Output('growth-predictions','children'),
-              Input('submit-val','n_clicks'),
-              State('user-input','data'),
-              State('monthly_investment','value'),
-              State('years_to_invest','value'))
-def investmentPredictions (n_clicks, data, monthly, years):
-    user_data = pd.DataFrame(data)                                      # make a dataframe of the user data
-    prediction1 = inv.amountPeryear(user_data, monthly, years)          # get a prediction from the functions we made
-    prediction = prediction1.iloc[-1:]                                  # get the last value of the dataframe
-    prediction = prediction['Amount'].values[0]
-    return f'Predicted Future Portfolio Worth: ${prediction.round(2)}' 
-
-# callback and function to get the dollar amount invested over the years not including initial investment
-@app.callback(Output('amt-invested','children'),
-              Input('submit-val','n_clicks'),
-              State('user-input','data'),
-              State('monthly_investment','value'),
-              State('years_to_invest','value'))
-def investmentPredictions (n_clicks, data, monthly, years):
-    user_data = pd.DataFrame(data)                                      # make a dataframe of the user data
-    current_portfolio_worth = inv.currentPortfolioWorth(user_data)      # determine the current worth of the user portfolio
-    amount_invested = ((monthly*12)*years)+current_portfolio_worth      # determine the total amount invested
-    return f'Total Amount Invested: ${amount_invested.round(2)}' 
-
-# callback function to make a graph of the predictions we just performed
-@app.callback(Output('predictions-graph','figure'),
-              Input('submit-val','n_clicks'),
-              State('user-input','data'),
-              State('monthly_investment','value'),
-              State('years_to_invest','value'))
-def investmentPredictions (n_clicks, data, monthly, years):
-    user_data = pd.DataFrame(data)                                                                      # make a dataframe of the userdata
-    prediction = inv.amountPeryear(user_data, monthly, years)                                           # get a prediction for the growth
-    pred_with_investments = inv.compareInvestedtoGrowth(prediction,user_data,monthly,years)             # add the amount invested as a new column in the dataframe
+# the table edits, the pie chart and the quick preview only need arithmetic so they run in the browser, see assets/clientside.js
+# callback to add rows to the datatable and to update the percent column
+app.clientside_callback(ClientsideFunction(namespace='portfolio', function_name='updateRows'),
+                        Output('user-input', 'data'),
+                        Input('user-input','data_timestamp'),
+                        Input('editing-rows-button', 'n_clicks'),
+                        State('user-input', 'data'))
+
+# callback to make the pie chart of the users current investment distributions
+app.clientside_callback(ClientsideFunction(namespace='portfolio', function_name='pieChart'),
+                        Output('investment-distribution','figure'),
+                        Input('user-input','data'))
+
+# callback to keep the list of tickers in the table, it only changes when the tickers change
+app.clientside_callback(ClientsideFunction(namespace='portfolio', function_name='tableTickers'),
+                        Output('table-tickers','data'),
+                        Input('user-input','data'),
+                        State('table-tickers','data'))
+
+# callback to preview the growth from the ticker statistics as the inputs change
+app.clientside_callback(ClientsideFunction(namespace='portfolio', function_name='previewProjection'),
+                        Output('preview-graph','figure'),
+                        Input('user-input','data'),
+                        Input('monthly_investment','value'),
+                        Input('years_to_invest','value'),
+                        Input('ticker-stats','data'))
+
+# callback and function to fetch the statistics the preview needs, this only runs when the tickers in the table change
+@app.callback(Output('ticker-stats','data'),
+              Input('table-tickers','data'))
+@metrics.timedCallback('tickerStats')
+def tickerStats (tickers):
+    return inv.previewStats(tickers or [])
+
+# function to make a graph comparing the predicted worth to the amount invested, with the range of outcomes if there was a simulation
+@metrics.timed('figure')
+def growthFigure (pred_with_investments, simulation):
     fig2 = go.Figure()                                                                                  # make a graph comparing the trends of these columns
     fig2.add_trace(go.Scatter(x = pred_with_investments['Year'], y = pred_with_investments['Amount'], 
                               name = 'Predicted Investments Worth',
@@ -218,6 +222,17 @@ def investmentPredictions (n_clicks, data, monthly, years):
     fig2.add_trace(go.Scatter(x = pred_with_investments['Year'], y = pred_with_investments['Money_Invested'],
                               name ='Amount Invested',
                               line = dict(color='#949494', dash='dash')))
+    # add the range of outcomes from the simulation as a fan around the median
+    if simulation is not None:
+        fig2.add_trace(go.Scatter(x = simulation['Year'], y = simulation['P95'],
+                                  name = '95th Percentile',
+                                  line = dict(color='#CDA34F', width=0)))
+        fig2.add_trace(go.Scatter(x = simulation['Year'], y = simulation['P5'],
+                                  name = '5th Percentile', fill = 'tonexty', fillcolor = 'rgba(205,163,79,0.3)',
+                                  line = dict(color='#CDA34F', width=0)))
+        fig2.add_trace(go.Scatter(x = simulation['Year'], y = simulation['P50'],
+                                  name = 'Simulated Median Worth',
+                                  line = dict(color='#CDA34F', dash='dot')))
     fig2.update_layout(legend_title_text = 'Legend',legend = dict(font=dict(size=15, color='#373F27', family = 'Verdana')))
     fig2.update_layout(title = 'Predicted Portfolio Growth',title_font=dict(size=20, color='#373F27', family = 'Verdana'))
     fig2.update_xaxes(title = 'Year', title_font=dict(size=15, color='#373F27', family = 'Verdana'))
@@ -225,6 +240,96 @@ def investmentPredictions (n_clicks, data, monthly, years):
     fig2.update_layout(plot_bgcolor = '#E9E7DA')
     return fig2
 
+# function to make a heatmap of the predicted worth for a grid of monthly investments and years around what the user entered
+@metrics.timed('figure')
+def sweepFigure (user_data, monthly, years):
+    monthly_amounts = np.linspace(0, 2*monthly if monthly else 1000, 50)                                # 50 monthly investments from zero to twice the user's
+    years_range = range(1, max(50, years)+1)                                                            # every number of years up to 50
+    grid = inv.sweepGrid(user_data, monthly_amounts, years_range)
+    fig3 = go.Figure(go.Heatmap(x = grid.columns, y = grid.index, z = grid.values,
+                                colorscale = [[0, '#E9E7DA'], [0.5, '#CDA34F'], [1, '#373F27']],
+                                colorbar = dict(title = 'Worth (USD)'),
+                                hovertemplate = 'Monthly: $%{x:.2f}<br>Years: %{y}<br>Worth: $%{z:,.2f}<extra></extra>'))
+    # mark what the user entered
+    fig3.add_trace(go.Scatter(x = [monthly], y = [years], mode = 'markers', name = 'Your Plan',
+                              marker = dict(color='#636B46', size=12, line=dict(color='#FFFFFF', width=2))))
+    fig3.update_layout(title = 'Predicted Portfolio Worth by Monthly Investment and Years',title_font=dict(size=20, color='#373F27', family = 'Verdana'))
+    fig3.update_xaxes(title = 'Amount Invested per Month (USD)', title_font=dict(size=15, color='#373F27', family = 'Verdana'))
+    fig3.update_yaxes(title = 'Years', title_font=dict(size=15, color='#373F27', family = 'Verdana'))
+    fig3.update_layout(plot_bgcolor = '#E9E7DA')
+    return fig3
+
+# callback and function to count the tickers a user submits so the popular ones are kept warm
+# this is its own callback so the counts stay in the worker when the prediction runs as a background job
+@app.callback(Input('submit-val','n_clicks'),
+              State('user-input','data'))
+def recordTickers (n_clicks, data):
+    warmer.record([row.get('ticker') for row in data or []])
+
+# the outputs and inputs of the Submit callback
+prediction_outputs = [Output('growth-predictions','children'),
+                      Output('amt-invested','children'),
+                      Output('predictions-graph','figure'),
+                      Output('sweep-graph','figure')]
+prediction_inputs = [Input('submit-val','n_clicks'),
+                     State('user-input','data'),
+                     State('monthly_investment','value'),
+                     State('years_to_invest','value'),
+                     State('simulation-mode','value')]
+
+# function to get the predicted value of the invests, the amount invested and the graph comparing them
+# the prediction is only calculated once per click and all three outputs are made from it
+@metrics.timedCallback('investmentPredictions')
+def investmentPredictions (n_clicks, data, monthly, years, mode):
+    user_data = pd.DataFrame(data)                                                                      # make a dataframe of the userdata
+    prediction = inv.amountPeryear(user_data, monthly, years)                                           # get a prediction for the growth
+    pred_with_investments = inv.compareInvestedtoGrowth(prediction,user_data,monthly,years)             # add the amount invested as a new column in the dataframe
+    predicted_worth = pred_with_investments['Amount'].values[-1]                                        # get the last predicted value of the dataframe
+    amount_invested = pred_with_investments['Money_Invested'].values[-1]                                # the total amount invested including the initial investment
+    # simulate the range of outcomes if the user asked for it
+    simulation = None
+    if mode and 'monte-carlo' in mode:
+        simulation = inv.simulateGrowth(user_data, monthly, years, Processes = simulation_processes)
+    fig2 = growthFigure(pred_with_investments, simulation)
+    # the heatmap is extra, if it can't be made the prediction is still shown
+    try:
+        fig3 = sweepFigure(user_data, monthly, years)
+    except Exception:
+        metrics.logger.warning('sweep heatmap could not be made', exc_info=True)
+        fig3 = go.Figure()
+        fig3.update_layout(title = 'Predicted Portfolio Worth by Monthly Investment and Years is not available',
+                           title_font=dict(size=20, color='#373F27', family = 'Verdana'))
+    return (f'Predicted Future Portfolio Worth: ${predicted_worth.round(2)}',
+            f'Total Amount Invested: ${amount_invested.round(2)}',
+            fig2, fig3)
+
+# function for the background job, the tickers are loaded first so the page can show which ticker has loaded
+def investmentJob (set_progress, n_clicks, data, monthly, years, mode):
+    tickers = list(dict.fromkeys(row.get('ticker') for row in data or [] if isinstance(row.get('ticker'), str) and row.get('ticker')))
+    loaded = []
+    def tickerLoaded (ticker):
+        loaded.append(ticker)
+        set_progress((100*len(loaded)/(len(tickers)+1), f'Loaded {ticker} ({len(loaded)} of {len(tickers)})'))
+    inv.prefetch(tickers, Done = tickerLoaded)
+    set_progress((100*len(tickers)/(len(tickers)+1), 'Projecting'))
+    return investmentPredictions(n_clicks, data, monthly, years, mode)
+
+# run the prediction in the request, or as a background job if there is a job manager
+# a job with the same inputs as a running job is shared, and submitting again or clicking cancel stops the job that is running
+if job_manager is None:
+    app.callback(*prediction_outputs, *prediction_inputs, prevent_initial_call = True)(investmentPredictions)
+else:
+    app.callback(*prediction_outputs, *prediction_inputs,
+                 background = True,
+                 prevent_initial_call = True,
+                 manager = job_manager,
+                 progress = [Output('job-progress','value'), Output('job-progress','label')],
+                 progress_default = [0, ''],
+                 running = [(Output('job-progress','style'), {'display':'flex'}, {'display':'none'}),
+                            (Output('cancel-val','style'), {}, {'display':'none'})],
+                 cancel = [Input('cancel-val','n_clicks')],
+                 cache_args_to_ignore = [0])(investmentJob)
+
 # Run the app
 if __name__ == '__main__':
     app.run_server()
\ No newline at end of file
@@ -0,0 +1,96 @@
+// callbacks that run in the browser so editing the table doesn't need a round trip to the server
+// dash loads every .js file in the assets folder automatically
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    portfolio: {
+        // add a row when the button is clicked and update the percent column from the quantities
+        updateRows: function (timestamp, n_clicks, rows) {
+            rows = (rows || []).map(function (row) { return Object.assign({}, row); });
+            var triggered = dash_clientside.callback_context.triggered || [];
+            if (triggered.some(function (t) { return t.prop_id === 'editing-rows-button.n_clicks'; })) {
+                rows.push({'ticker': '', 'quantity': 0, 'future_percents': 0, 'percent': 0, 'editable': true, 'deletable': true});
+            }
+            // find the percent of current portfolio each investment has, leave it alone if a quantity isn't a number
+            var quantities = rows.map(function (row) { return parseFloat(row['quantity']); });
+            var total = quantities.reduce(function (a, b) { return a + b; }, 0);
+            if (isFinite(total) && total !== 0) {
+                rows.forEach(function (row, i) { row['percent'] = (quantities[i] / total) * 100; });
+            }
+            return rows;
+        },
+
+        // make the pie chart of the users current investment distribution
+        pieChart: function (rows) {
+            rows = rows || [];
+            return {
+                'data': [{
+                    'type': 'pie',
+                    'values': rows.map(function (row) { return row['percent']; }),
+                    'labels': rows.map(function (row) { return row['ticker']; }),
+                    'marker': {
+                        'colors': ['rgb(254, 252, 205)', 'rgb(239, 225, 156)', 'rgb(221, 201, 106)', 'rgb(194, 182, 59)',
+                                   'rgb(157, 167, 21)', 'rgb(116, 153, 5)', 'rgb(75, 138, 20)', 'rgb(35, 121, 36)',
+                                   'rgb(11, 100, 44)', 'rgb(18, 78, 43)', 'rgb(25, 56, 34)', 'rgb(23, 35, 18)'],
+                        'line': {'color': '#373737', 'width': 1}
+                    }
+                }],
+                'layout': {
+                    'plot_bgcolor': '#D5D5D5',
+                    'title': {'text': 'User Investment Strategy', 'font': {'size': 20, 'color': '#373F27', 'family': 'Verdana'}}
+                }
+            };
+        },
+
+        // the tickers in the table, only changes when a ticker is added, removed or renamed so the server only fetches then
+        tableTickers: function (rows, current) {
+            var tickers = (rows || []).map(function (row) { return row['ticker']; })
+                .filter(function (ticker) { return typeof ticker === 'string' && ticker.length > 0; });
+            tickers = tickers.filter(function (ticker, i) { return tickers.indexOf(ticker) === i; }).sort();
+            if (current && JSON.stringify(current) === JSON.stringify(tickers)) {
+                return dash_clientside.no_update;
+            }
+            return tickers;
+        },
+
+        // quick preview of the growth using the statistics of each ticker, the same calculation as the server
+        previewProjection: function (rows, monthly, years, stats) {
+            monthly = parseFloat(monthly) || 0;
+            years = parseInt(years) || 0;
+            stats = stats || {};
+            if (years < 1 || !rows) {
+                return {'data': [], 'layout': {'title': {'text': 'Quick Preview: enter the amount and years to invest'}}};
+            }
+            var worth = new Array(years + 1).fill(0);
+            rows.forEach(function (row) {
+                var ticker = stats[row['ticker']];
+                if (!ticker) { return; }
+                // the rates for the lookback, the lists stop once the lookback is the whole history
+                var k = Math.min(years, ticker['rate'].length) - 1;
+                var interest = ticker['rate'][k], dividends = ticker['dividend'][k], avg_cost = ticker['avg_cost'][k];
+                if (interest === null || dividends === null || avg_cost === null) { return; }
+                var amt = ticker['current_cost'] * parseFloat(row['quantity']);
+                var contribution = (parseFloat(row['future_percents']) / 100) * monthly;
+                if (!isFinite(amt) || !isFinite(contribution)) { return; }
+                worth[0] += amt;
+                for (var i = 2; i <= years * 12; i++) {
+                    amt = amt + amt * (interest / 12) + contribution + ((i % 3) === 0 ? (amt / avg_cost) * dividends : 0);
+                    if (i % 12 === 0) { worth[i / 12] += amt; }
+                }
+            });
+            var year = worth.map(function (w, i) { return i; });
+            return {
+                'data': [
+                    {'type': 'scatter', 'x': year, 'y': worth, 'name': 'Predicted Investments Worth', 'line': {'color': '#636B46'}},
+                    {'type': 'scatter', 'x': year, 'y': year.map(function (i) { return worth[0] + monthly * 12 * i; }),
+                     'name': 'Amount Invested', 'line': {'color': '#949494', 'dash': 'dash'}}
+                ],
+                'layout': {
+                    'title': {'text': 'Quick Preview of Portfolio Growth', 'font': {'size': 20, 'color': '#373F27', 'family': 'Verdana'}},
+                    'legend': {'title': {'text': 'Legend'}, 'font': {'size': 15, 'color': '#373F27', 'family': 'Verdana'}},
+                    'xaxis': {'title': {'text': 'Year', 'font': {'size': 15, 'color': '#373F27', 'family': 'Verdana'}}},
+                    'yaxis': {'title': {'text': 'Portfolio Worth (USD)', 'font': {'size': 15, 'color': '#373F27', 'family': 'Verdana'}}},
+                    'plot_bgcolor': '#E9E7DA'
+                }
+            };
+        }
+    }
+});
@@ -0,0 +1,201 @@
+# headless batch runs of the model for many portfolios and scenarios at once
+# usage: python batch.py portfolios.jsonl results.csv [--processes 4] [--chunk-size 256]
+# each line of the input is one portfolio, a .json file with a list of portfolios also works:
+#   {"id": "client-1", "holdings": [{"ticker": "FXAIX", "quantity": 16.81, "future_percents": 100}],
+#    "scenarios": [{"monthly": 500, "years": 10}, {"monthly": 1000, "years": 30}]}
+# the output has one row per portfolio, scenario and year: id, monthly, years, year, amount, money_invested
+# libraries
+import argparse
+import csv
+import json
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import investment_functions as inv
+import metrics
+
+output_columns = ['id', 'monthly', 'years', 'year', 'amount', 'money_invested']
+
+# read the portfolios from a file one at a time so the whole file is never held in memory
+def readPortfolios (Path):
+    with open(Path) as file:
+        if Path.endswith('.jsonl'):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(file)
+
+# project a stack of holdings that all use the same number of years, this is at the top of the module so it can run in a process pool
+# returns the worth at the end of each year summed over the holdings of each scenario
+def projectYearEnds (Principal,Contribution,Interest,Dividends,Avg_cost,Scenario_index,Scenarios,Years):
+    amounts = inv.projectGrowth(Principal, Contribution, Interest, Dividends, Avg_cost, Years*12)
+    totals = np.zeros((Scenarios, Years))
+    np.add.at(totals, Scenario_index, amounts[:, 11::12][:, :Years])
+    return totals
+
+# writes the results to a csv or parquet file as they are found
+class ResultWriter:
+    def __init__(self, Path, Format):
+        self.format = Format
+        if Format == 'parquet':
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise ImportError('pyarrow is needed to write parquet files, install it or use --format csv')
+            self.pyarrow = pyarrow
+            self.schema = pyarrow.schema([('id', pyarrow.string()), ('monthly', pyarrow.float64()), ('years', pyarrow.int64()),
+                                          ('year', pyarrow.int64()), ('amount', pyarrow.float64()), ('money_invested', pyarrow.float64())])
+            self.writer = pyarrow.parquet.ParquetWriter(Path, self.schema)
+            # the rows of a chunk are kept until it is done and written as one row group, one group per scenario would be tiny
+            self.rows = {name: [] for name in output_columns}
+        else:
+            self.file = open(Path, 'w', newline='')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(output_columns)
+
+    # write the yearly results of one scenario
+    def write(self, Id, Monthly, Years, Amounts):
+        years = np.arange(0, Years+1)
+        money_invested = Amounts[0] + Monthly*12*years
+        if self.format == 'parquet':
+            self.rows['id'].extend([str(Id)]*len(years))
+            self.rows['monthly'].extend([float(Monthly)]*len(years))
+            self.rows['years'].extend([Years]*len(years))
+            self.rows['year'].extend(years.tolist())
+            self.rows['amount'].extend(np.asarray(Amounts, dtype=float).tolist())
+            self.rows['money_invested'].extend(np.asarray(money_invested, dtype=float).tolist())
+        else:
+            for year, amount, invested in zip(years, Amounts, money_invested):
+                self.writer.writerow([Id, Monthly, Years, year, amount, invested])
+
+    # write the rows kept for the parquet file, the csv rows are already written
+    def flush(self):
+        if self.format == 'parquet' and self.rows['id']:
+            self.writer.write_table(self.pyarrow.table(self.rows, schema=self.schema))
+            self.rows = {name: [] for name in output_columns}
+
+    def close(self):
+        if self.format == 'parquet':
+            self.flush()
+            self.writer.close()
+        else:
+            self.file.close()
+
+# group the portfolios into chunks so only one chunk is in memory at a time
+def chunks (Portfolios, Chunk_size):
+    chunk = []
+    for portfolio in Portfolios:
+        chunk.append(portfolio)
+        if len(chunk) == Chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# function to check a portfolio has everything the batch reads before any of it is used, raises ValueError if it doesn't
+def checkPortfolio (Portfolio):
+    if not isinstance(Portfolio, dict):
+        raise ValueError('a portfolio has to be an object')
+    missing = [name for name in ['id', 'holdings', 'scenarios'] if name not in Portfolio]
+    if missing:
+        raise ValueError(f"the portfolio is missing {', '.join(missing)}")
+    if not isinstance(Portfolio['holdings'], list) or not isinstance(Portfolio['scenarios'], list):
+        raise ValueError('the holdings and scenarios of a portfolio have to be lists')
+    for holding in Portfolio['holdings']:
+        missing = [name for name in ['ticker', 'quantity', 'future_percents'] if not isinstance(holding, dict) or name not in holding]
+        if missing:
+            raise ValueError(f"a holding is missing {', '.join(missing)}")
+
+# the id of a portfolio for the log, a record that isn't an object doesn't have one
+def portfolioId (Portfolio):
+    return Portfolio.get('id') if isinstance(Portfolio, dict) else None
+
+# find the model inputs of every holding of every scenario in a chunk
+# the rates of each ticker are only looked up once for each number of years
+def chunkInputs (Chunk):
+    # leave out the records that are missing something so one bad line doesn't stop the whole run
+    portfolios = []
+    for portfolio in Chunk:
+        try:
+            checkPortfolio(portfolio)
+        except ValueError:
+            metrics.logger.warning('portfolio could not be run', exc_info=True, extra={'fields': {'portfolio': portfolioId(portfolio)}})
+            continue
+        portfolios.append(portfolio)
+    inv.prefetch(holding['ticker'] for portfolio in portfolios for holding in portfolio['holdings'])
+    rates = {}
+    scenarios = []                                                          # (id, monthly, years, worth) of each scenario
+    stacks = {}                                                             # years -> rows of (principal, contribution, interest, dividends, avg_cost, scenario)
+    for portfolio in portfolios:
+        try:
+            holdings = []
+            for holding in portfolio['holdings']:
+                stats = inv.tickerStats(holding['ticker'])
+                holdings.append((holding['ticker'], stats.current_cost*holding['quantity'], holding['future_percents']/100))
+        except Exception:
+            # leave out a portfolio that can't be run, like one with a ticker that doesn't exist, and keep going
+            metrics.logger.warning('portfolio could not be run', exc_info=True, extra={'fields': {'portfolio': portfolio.get('id')}})
+            continue
+        worth = sum(principal for ticker, principal, percent in holdings)
+        for scenario in portfolio['scenarios']:
+            try:
+                monthly, years = scenario['monthly'], int(scenario['years'])
+                scenario_rows = []
+                # a plan of zero years is only the current worth so there are no rates to find
+                if years >= 1:
+                    for ticker, principal, percent in holdings:
+                        if (ticker, years) not in rates:
+                            rates[(ticker, years)] = (inv.interestRate(years, ticker), inv.CalculateAvgDividend(ticker, years),
+                                                      inv.CalculateAvgCostPerShare(years, ticker))
+                        scenario_rows.append((principal, percent*monthly) + rates[(ticker, years)] + (len(scenarios),))
+            except Exception:
+                # leave out a scenario that can't be run, like one longer than a ticker's history allows, and keep the rest of the portfolio
+                metrics.logger.warning('scenario could not be run', exc_info=True,
+                                       extra={'fields': {'portfolio': portfolio.get('id'), 'scenario': scenario}})
+                continue
+            scenarios.append((portfolio['id'], monthly, years, worth))
+            stacks.setdefault(years, []).extend(scenario_rows)
+    return scenarios, stacks
+
+# run the model for every scenario of every portfolio and write the yearly results to a file
+def evaluateBatch (Portfolios, Output, Format='csv', Processes=1, Chunk_size=256):
+    writer = ResultWriter(Output, Format)
+    pool = ProcessPoolExecutor(max_workers=Processes) if Processes > 1 else None
+    count = 0
+    try:
+        for chunk in chunks(Portfolios, Chunk_size):
+            scenarios, stacks = chunkInputs(chunk)
+            # project each number of years as one stacked array, in the pool if there is one
+            jobs = {}
+            for years, rows in stacks.items():
+                if years < 1 or not rows:
+                    continue
+                columns = np.array(rows, dtype=float)
+                arguments = (columns[:, 0], columns[:, 1], columns[:, 2], columns[:, 3], columns[:, 4],
+                             columns[:, 5].astype(int), len(scenarios), years)
+                jobs[years] = pool.submit(projectYearEnds, *arguments) if pool else projectYearEnds(*arguments)
+            totals = {years: job.result() if pool else job for years, job in jobs.items()}
+            # write each scenario with its starting worth as year 0, a portfolio without holdings is worth nothing at the end of each year
+            for index, (portfolio_id, monthly, years, worth) in enumerate(scenarios):
+                year_ends = totals[years][index] if years in totals else np.zeros(years)
+                writer.write(portfolio_id, monthly, years, np.concatenate(([worth], year_ends)))
+                count += 1
+            writer.flush()
+    finally:
+        writer.close()
+        if pool:
+            pool.shutdown()
+    return count
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the portfolio growth model for a file of portfolios and scenarios.')
+    parser.add_argument('input', help='.jsonl file with one portfolio per line, or a .json file with a list of portfolios')
+    parser.add_argument('output', help='file to write the results to')
+    parser.add_argument('--format', choices=['csv', 'parquet'], help='output format, found from the output file name if not given')
+    parser.add_argument('--processes', type=int, default=1, help='number of processes to project with')
+    parser.add_argument('--chunk-size', type=int, default=256, help='number of portfolios to hold in memory at a time')
+    args = parser.parse_args()
+    output_format = args.format or ('parquet' if args.output.endswith('.parquet') else 'csv')
+    count = evaluateBatch(readPortfolios(args.input), args.output, output_format, args.processes, args.chunk_size)
+    metrics.logger.info('batch finished', extra={'fields': {'scenarios': count, 'output': args.output}})
@@ -0,0 +1,172 @@
+# benchmarks for the projection and valuation hot paths
+# runs offline on synthetic price history so the results only measure our code, not yahoo finance
+# usage: python benchmark.py --output results.json [--compare old_results.json]
+#        python benchmark.py --memory 5 for the memory used by each cached ticker
+# libraries
+import argparse
+import json
+import os
+import pickle
+import platform
+import time
+import tracemalloc
+import zlib
+import numpy as np
+import pandas as pd
+import investment_functions as inv
+from market_data import MarketDataProvider, dateRange, trimHistory
+from price_cache import PriceCache
+
+# the sizes to sweep
+default_tickers = [1, 5, 20, 100]
+default_years = [1, 10, 25, 50]
+
+# function to make a synthetic daily price history for a ticker, the same ticker always gets the same history
+def syntheticHistory (Ticker, Start=None):
+    rng = np.random.default_rng(zlib.crc32(Ticker.encode()))
+    dates = pd.bdate_range(Start or '1965-01-01', pd.Timestamp.today().normalize(), tz='America/New_York')
+    # the market is closed on new years day
+    dates = dates[~((dates.month == 1) & (dates.day == 1))]
+    opens = 20*np.exp(np.cumsum(rng.normal(0.0003, 0.01, len(dates))))
+    # a dividend on the first trading day after the 15th of every third month
+    dividends = np.zeros(len(dates))
+    quarter = np.flatnonzero((dates.month % 3 == 0) & (dates.day >= 15))
+    quarter = quarter[np.r_[True, np.diff(quarter) > 1]]
+    dividends[quarter] = rng.uniform(0.1, 0.5, len(quarter))
+    return pd.DataFrame({'Date': dates, 'Open': opens, 'High': opens, 'Low': opens, 'Close': opens,
+                         'Volume': 1000, 'Dividends': dividends, 'Stock Splits': 0.0})
+
+# provider that gives the synthetic history instead of yahoo finance, the days asked for are cut from the whole history so they always match
+class SyntheticProvider(MarketDataProvider):
+    def history(self, Tickers, Start=None, End=None):
+        return {ticker: dateRange(trimHistory(syntheticHistory(ticker)), Start, End) for ticker in Tickers}
+
+# function to point the model at the synthetic history with caches of its own
+# the synthetic tickers must not be written to the PRICE_STORE_DIR store or the shared PRICE_CACHE_DIR of the app, and clearing the cache mustn't empty them
+def useSyntheticHistory ():
+    inv.provider = SyntheticProvider()
+    inv.price_store = None
+    inv.price_cache = PriceCache(inv.loadHistory, Max_bytes = inv.price_cache.max_bytes)
+
+# function to make a portfolio with a number of tickers
+def syntheticPortfolio (Tickers):
+    return pd.DataFrame({'ticker': [f'SYN{i}' for i in range(Tickers)],
+                         'quantity': [10.0]*Tickers,
+                         'future_percents': [100/Tickers]*Tickers})
+
+# function to empty the projection memo so a run projects every ticker instead of finding it in the memo
+def resetProjections ():
+    inv.projection_cache = inv.ProjectionCache(inv.projection_cache.max_entries)
+
+# function to time a function, returns the best and median time of the repeats and the peak memory of one more run
+# Setup is called before each run and isn't timed
+def measure (Function, Repeats, Setup=None):
+    times = []
+    for i in range(Repeats):
+        if Setup:
+            Setup()
+        start = time.perf_counter()
+        Function()
+        times.append(time.perf_counter()-start)
+    # measure the memory in a separate run since tracing slows the function down
+    if Setup:
+        Setup()
+    tracemalloc.start()
+    Function()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'best_s': min(times), 'median_s': float(np.median(times)), 'peak_bytes': peak}
+
+# the functions to benchmark for a portfolio and number of years, with the setup to call before each run
+# the projections are timed cold, with an empty projection memo, and warm, with every ticker already in the memo
+def cases (Portfolio, Years, Submit):
+    monthly = 500
+    yield 'currentPortfolioWorth', lambda: inv.currentPortfolioWorth(Portfolio), None
+    yield 'interestRate', lambda: [inv.interestRate(Years, ticker) for ticker in Portfolio['ticker']], None
+    inputs = inv.projectionInputs(Portfolio, monthly, Years)
+    projections = [('projectPortfolio', lambda: inv.projectPortfolio(Portfolio['ticker'], *inputs, Years*12)),
+                   ('totalInvestmentPrediction', lambda: inv.totalInvestmentPrediction(Portfolio, monthly, Years)),
+                   ('amountPeryear', lambda: inv.amountPeryear(Portfolio, monthly, Years))]
+    for name, function in projections:
+        yield f'{name}_cold', function, resetProjections
+        function()
+        yield f'{name}_warm', function, None
+    if Submit is not None:
+        yield 'submit_cold', lambda: Submit(1, Portfolio.to_dict('records'), monthly, Years, []), resetProjections
+
+# run all of the benchmarks and return the report
+def run (Tickers, Years, Repeats, Include_submit):
+    # use the synthetic history instead of yahoo finance
+    useSyntheticHistory()
+    submit = None
+    if Include_submit:
+        # the background cache warmer would fetch at the same time as the timed runs
+        os.environ.setdefault('CACHE_WARMER_ENABLED', '0')
+        import app
+        submit = app.investmentPredictions
+    results = []
+    for tickers in Tickers:
+        portfolio = syntheticPortfolio(tickers)
+        # time fetching the histories into an empty cache
+        inv.price_cache.clear()
+        start = time.perf_counter()
+        inv.prefetch(portfolio['ticker'])
+        elapsed = time.perf_counter()-start
+        results.append({'function': 'prefetch_cold', 'tickers': tickers, 'years': None,
+                        'best_s': elapsed, 'median_s': elapsed, 'peak_bytes': None})
+        for years in Years:
+            for name, function, setup in cases(portfolio, years, submit):
+                result = measure(function, Repeats, setup)
+                results.append(dict({'function': name, 'tickers': tickers, 'years': years}, **result))
+                print(f"{name:28s} tickers={tickers:<4d} years={years:<3d} best={result['best_s']*1000:9.2f} ms  peak={result['peak_bytes']/1e6:8.2f} MB", flush=True)
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'platform': platform.platform(), 'repeats': Repeats, 'results': results}
+
+# the memory each cached ticker uses, the full daily history the model used to keep against the compact history kept now
+def memoryReport (Tickers):
+    useSyntheticHistory()
+    rows = []
+    for ticker in syntheticPortfolio(Tickers)['ticker']:
+        daily = syntheticHistory(ticker)
+        history = inv.loadHistory(ticker)
+        rows.append({'ticker': ticker, 'days': len(daily), 'daily_frame_bytes': int(daily.memory_usage(deep=True).sum()),
+                     'compact_bytes': history.nbytes, 'stats_bytes': history.stats.nbytes, 'pickle_bytes': len(pickle.dumps(history))})
+    report = pd.DataFrame(rows)
+    print(report.to_string(index=False))
+    print(f"bytes per ticker: daily frame {report['daily_frame_bytes'].mean():,.0f}  compact {report['compact_bytes'].mean():,.0f}  "
+          f"ratio {report['daily_frame_bytes'].sum()/report['compact_bytes'].sum():.1f}x")
+    return {'tickers': rows}
+
+# compare two reports, a ratio above 1 means the new run is slower
+def compare (Old, New):
+    old = {(r['function'], r['tickers'], r['years']): r for r in Old['results']}
+    print(f"{'function':28s} {'tickers':>7s} {'years':>5s} {'old ms':>10s} {'new ms':>10s} {'ratio':>7s}")
+    for result in New['results']:
+        key = (result['function'], result['tickers'], result['years'])
+        if key in old and old[key]['best_s']:
+            ratio = result['best_s']/old[key]['best_s']
+            print(f"{key[0]:28s} {key[1]:7d} {str(key[2]):>5s} {old[key]['best_s']*1000:10.2f} {result['best_s']*1000:10.2f} {ratio:7.2f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the projection and valuation functions on synthetic data.')
+    parser.add_argument('--tickers', type=int, nargs='+', default=default_tickers, help='portfolio sizes to sweep')
+    parser.add_argument('--years', type=int, nargs='+', default=default_years, help='investment horizons to sweep')
+    parser.add_argument('--repeats', type=int, default=5, help='number of timed runs of each case')
+    parser.add_argument('--no-submit', action='store_true', help='skip the end to end Submit callback')
+    parser.add_argument('--output', help='file to write the json report to')
+    parser.add_argument('--compare', help='json report of an earlier run to compare against')
+    parser.add_argument('--memory', type=int, metavar='TICKERS', help='only report the memory used by this many cached tickers')
+    args = parser.parse_args()
+    if args.memory:
+        report = memoryReport(args.memory)
+        if args.output:
+            with open(args.output, 'w') as file:
+                json.dump(report, file, indent=2)
+        raise SystemExit
+    report = run(args.tickers, args.years, args.repeats, not args.no_submit)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(json.load(file), report)
@@ -0,0 +1,106 @@
+# background thread that fills the price cache before users need it
+# it loads the starter tickers and the most requested tickers when the worker starts, then again after every market close
+# libraries
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from price_cache import nextMarketClose
+import metrics
+
+class CacheWarmer:
+    def __init__(self, Warm, Starter_tickers, Top_n=20, Popular_file=None, Next_refresh=nextMarketClose):
+        self.warm = Warm                                        # function that loads a list of tickers into the cache
+        self.starter_tickers = list(Starter_tickers)            # tickers that are always loaded
+        self.top_n = Top_n                                      # how many of the most requested tickers to load
+        self.popular_file = Popular_file                        # optional file to share the request counts between workers and restarts
+        self.next_refresh = Next_refresh                        # function that gives when the next refresh should happen
+        self.counts = Counter()                                 # requests for each ticker since the counts were last saved
+        self.lock = threading.Lock()
+        self.ready = threading.Event()                          # set once the first warm up has finished
+        self.stopping = threading.Event()
+        self.thread = None
+        self.last_warm = None
+
+    # count the tickers a user asked for
+    def record(self, Tickers):
+        with self.lock:
+            self.counts.update(ticker for ticker in Tickers if isinstance(ticker, str) and ticker)
+            # only keep the most requested tickers so typos don't pile up
+            if len(self.counts) > 2000:
+                self.counts = Counter(dict(self.counts.most_common(1000)))
+
+    # read the saved request counts
+    def savedCounts(self):
+        if not self.popular_file:
+            return Counter()
+        try:
+            with open(self.popular_file) as file:
+                return Counter(json.load(file))
+        except (OSError, ValueError):
+            return Counter()
+
+    # add the new request counts to the saved counts
+    def saveCounts(self):
+        with self.lock:
+            new_counts, self.counts = self.counts, Counter()
+        if not self.popular_file or not new_counts:
+            return
+        counts = self.savedCounts() + new_counts
+        # write to a temporary file first so other workers never read half a file
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.popular_file)), suffix='.tmp')
+        with os.fdopen(handle, 'w') as file:
+            json.dump(dict(counts.most_common(1000)), file)
+        os.replace(temp_path, self.popular_file)
+
+    # the tickers to load, the starter tickers then the most requested ones
+    def tickers(self):
+        with self.lock:
+            counts = self.savedCounts() + self.counts
+        popular = [ticker for ticker, count in counts.most_common(self.top_n)]
+        return list(dict.fromkeys(self.starter_tickers + popular))
+
+    # load the tickers into the cache, a failure is logged and the next refresh tries again
+    def warmOnce(self):
+        tickers = self.tickers()
+        start = time.perf_counter()
+        try:
+            self.warm(tickers)
+            self.saveCounts()
+        except Exception:
+            metrics.logger.warning('cache warm up failed', exc_info=True, extra={'fields': {'tickers': len(tickers)}})
+        self.last_warm = time.time()
+        metrics.logger.info('cache warmed', extra={'fields': {'tickers': len(tickers), 'duration_s': round(time.perf_counter()-start, 6)}})
+
+    # warm up now, then again at every refresh time until stopped
+    def run(self):
+        self.warmOnce()
+        self.ready.set()
+        while not self.stopping.wait(max(self.next_refresh() - time.time(), 1)):
+            self.warmOnce()
+
+    # start warming in the background
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='cache-warmer', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+
+    # wait until the first warm up has finished, returns if it is ready
+    def wait(self, Timeout=None):
+        return self.ready.wait(Timeout)
+
+    # the state of the warmer for the readiness endpoint
+    def status(self):
+        return {'ready': self.ready.is_set(), 'last_warm': self.last_warm, 'tickers': len(self.tickers())}
+
+    # add the /ready endpoint to the flask server, it answers 503 until the first warm up has finished
+    def register(self, Server):
+        @Server.route('/ready')
+        def readyEndpoint():
+            status = self.status()
+            return json.dumps(status), 200 if status['ready'] else 503, {'Content-Type': 'application/json'}
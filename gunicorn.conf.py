@@ -0,0 +1,12 @@
+# gunicorn settings, gunicorn reads this file automatically when it starts
+# libraries
+import os
+
+# wait for the cache warmer before a worker starts taking requests so the first users don't pay for the cold fetches
+# a worker that isn't warm in time starts anyway so a slow data provider can't stop the app from booting
+warm_timeout = float(os.environ.get('WARM_TIMEOUT', 25))
+
+def post_worker_init(worker):
+    import app
+    if not app.warmer.wait(warm_timeout):
+        worker.log.warning('cache was not warm after %s seconds, starting anyway', warm_timeout)
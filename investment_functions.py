@@ -1,134 +1,201 @@
 # libraries
 import pandas as pd
-import yfinance as yf
+import numpy as np
 from datetime import date
-import functools
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from market_data import providerFromConfig
+from price_cache import PriceCache, previousMarketClose
+from price_store import PriceStore, columnsFromFrame, viewsFromColumns
+from ticker_stats import TickerStats
+import metrics
 
 # data information
 today = date.today()
 month = today.month
 year = today.year
 
-# Function to connect to yahoo finance and cache the information we get
-# create a cache to store the data we get from yf
-@functools.cache
+# where the price history comes from, yahoo finance unless MARKET_DATA_PROVIDER chooses another provider
+provider = providerFromConfig()
+
+# the years of history to fetch for a ticker, set MARKET_DATA_LOOKBACK_YEARS=0 to fetch the whole history
+lookback_years = int(os.environ.get('MARKET_DATA_LOOKBACK_YEARS', 50))
+
+# the first day of history the model needs, one more year than the lookback so the growth rate of the first year can be found
+def lookbackStart ():
+    if lookback_years <= 0:
+        return None
+    return f'{year - lookback_years - 1}-01-01'
+
+# Function to get the price history of a ticker from the provider
+# give a start date to only get the days from that date onward, otherwise the days of the lookback are fetched
+def fetchHistory (Ticker, Start=None):
+    return provider.history([Ticker], Start = Start or lookbackStart())[Ticker]
+
+# the parts of the history of a ticker the model uses, the first of each month and the days dividends were distributed
+# the history is kept as typed arrays instead of dataframes to keep the memory of each cached ticker small:
+# the days as datetime64, the cost per share as float32 and the dividends only on the days they were distributed
+class PriceHistory:
+    __slots__ = ('month_dates', 'month_open', 'dividend_dates', 'dividend_amounts', 'stats')
+
+    def __init__(self, Columns):
+        # use the precomputed views if the columns came from the price store
+        rows = Columns if 'month_start' in Columns else dict(Columns, **viewsFromColumns(Columns))
+        self.month_dates = np.asarray(Columns['date'][rows['month_start']]).astype('datetime64[D]', copy=False)
+        self.month_open = np.asarray(Columns['open'][rows['month_start']], dtype=np.float32)
+        self.dividend_dates = np.asarray(Columns['date'][rows['dividend_rows']]).astype('datetime64[D]', copy=False)
+        self.dividend_amounts = np.asarray(Columns['dividends'][rows['dividend_rows']], dtype=np.float64)
+        # build the statistics index once, a refreshed history gets a new index
+        self.stats = TickerStats(self.month_dates, self.month_open, self.dividend_dates, self.dividend_amounts, year)
+
+    # the cost per share on the first of each month, the arrays are shared and not copied
+    @property
+    def monthly(self):
+        return {'Date': self.month_dates, 'Open': self.month_open}
+
+    # the dividends on the days they were distributed, the arrays are shared and not copied
+    @property
+    def dividends(self):
+        return {'Date': self.dividend_dates, 'Dividends': self.dividend_amounts}
+
+    # pickle the arrays, the statistics index is rebuilt when it is loaded
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__ if name != 'stats'}
+
+    def __setstate__(self, State):
+        for name, value in State.items():
+            setattr(self, name, value)
+        self.stats = TickerStats(self.month_dates, self.month_open, self.dividend_dates, self.dividend_amounts, year)
+
+    # how much memory the history uses, used to limit the size of the cache
+    @property
+    def nbytes(self):
+        # the statistics index shares the date arrays, so only the arrays it doesn't share are added
+        return int(self.month_open.nbytes + self.dividend_amounts.nbytes + self.stats.nbytes)
+
+# set PRICE_STORE_DIR to keep the history of every ticker on disk, then only the new days are fetched on a refresh
+price_store = PriceStore(os.environ['PRICE_STORE_DIR']) if os.environ.get('PRICE_STORE_DIR') else None
+
+# function to store the columns of a ticker and make its history
+# the store returns None when its files can't be read back, like when another worker is swapping them, then the fetched columns are used
+def writeHistory (Ticker, Columns):
+    stored = price_store.write(Ticker, Columns)
+    return PriceHistory(Columns if stored is None else stored)
+
+# function to make the history of a ticker from the store, if the stored files can't be read the whole history is fetched and stored again
+def storedHistory (Ticker, Stored):
+    if Stored is None:
+        return writeHistory(Ticker, columnsFromFrame(fetchHistory(Ticker)))
+    return PriceHistory(Stored)
+
+# Function to get the history of a ticker, using the price store if there is one
+@metrics.timed('fetch')
+def loadHistory (Ticker):
+    # without a price store get the whole history every time
+    if price_store is None:
+        return PriceHistory(columnsFromFrame(fetchHistory(Ticker)))
+    last_date = price_store.lastDate(Ticker)
+    # the ticker hasn't been stored yet so get the whole history
+    if last_date is None:
+        ticker_data = fetchHistory(Ticker)
+        # don't store tickers that don't exist
+        if len(ticker_data) == 0:
+            return PriceHistory(columnsFromFrame(ticker_data))
+        return writeHistory(Ticker, columnsFromFrame(ticker_data))
+    # the stored history is current if it was written after the last market close
+    if (price_store.updated(Ticker) or 0) >= previousMarketClose():
+        return storedHistory(Ticker, price_store.load(Ticker))
+    # get only the days after the last stored day, if the provider can't be reached use what is stored
+    try:
+        new_data = fetchHistory(Ticker, Start = str(last_date + np.timedelta64(1, 'D')))
+    except Exception:
+        return storedHistory(Ticker, price_store.load(Ticker))
+    # yahoo finance adjusts the whole history for dividends and splits, so get all of it again when there is a new one
+    if len(new_data) and ((new_data['Dividends'] != 0).any() or (new_data['Stock Splits'] != 0).any()):
+        return writeHistory(Ticker, columnsFromFrame(fetchHistory(Ticker)))
+    return storedHistory(Ticker, price_store.append(Ticker, columnsFromFrame(new_data)))
+
+# create a cache to store the data we get from yf, it is limited in size and refreshes after the market closes
+# set PRICE_CACHE_DIR to share the cache between all of the gunicorn workers
+price_cache = PriceCache(loadHistory,
+                         Max_bytes = int(os.environ.get('PRICE_CACHE_MAX_BYTES', 64*1024*1024)),
+                         Disk_dir = os.environ.get('PRICE_CACHE_DIR'))
+
+# report the cache statistics with the rest of the metrics
+def cacheMetrics ():
+    stats = price_cache.stats()
+    for name in ['hits', 'disk_hits', 'misses', 'evictions', 'expirations', 'shared_loads']:
+        yield f'# TYPE portfolio_price_cache_{name}_total counter'
+        yield f'portfolio_price_cache_{name}_total {stats[name]}'
+    for name in ['bytes', 'entries', 'max_bytes']:
+        yield f'# TYPE portfolio_price_cache_{name} gauge'
+        yield f'portfolio_price_cache_{name} {stats[name]}'
+
+metrics.addCollector(cacheMetrics)
+
+# the most tickers to fetch at the same time
+fetch_workers = int(os.environ.get('PRICE_FETCH_WORKERS', 8))
+
+# Function to get the cached information for a ticker
 def connectYahooFinance (Ticker):
-    # get the data for the specific ticker
-    ticker_data = yf.Ticker(Ticker)
-    # create a dataframe of the history of the ticker
-    ticker_data = pd.DataFrame(ticker_data.history(period = 'max'))
-    # correct the index for the dataframe
-    ticker_data.reset_index(inplace = True)
-    return ticker_data
+    return price_cache.get(Ticker)
+
+# Function to fetch all of the tickers that are not cached at the same time instead of one by one
+# give Done to be called with each ticker as it finishes loading
+def prefetch (Tickers, Done=None):
+    # skip the empty rows of the table
+    price_cache.prefetch([ticker for ticker in Tickers if isinstance(ticker, str) and ticker], fetch_workers, Done)
 
 # function to get historical monthly cost per share
 def MonthlyCost (Ticker):
     # first call the connect to yahoofinance function
     ticker_data = connectYahooFinance(Ticker)
-    # filter data to only include info from the first of the month
-    return ticker_data[ticker_data['Date'].dt.is_month_start]
+    # the info from the first of the month is precomputed, returns the date and open columns
+    return ticker_data.monthly
 
 # function to get historical dividend amt per share
 def quarterlyDividends (Ticker):
     # first call the conncet to yahoofinance function
     ticker_data = connectYahooFinance(Ticker)
-    # filter data to only include info when dividends were distributed
-    return ticker_data[ticker_data['Dividends']!=0]
+    # the info when dividends were distributed is precomputed, returns the date and dividends columns
+    return ticker_data.dividends
+
+# function to get the statistics index of a ticker
+def tickerStats (Ticker):
+    return connectYahooFinance(Ticker).stats
 
 # function to calcuate the average dividends for each ticker
+# the time span is the years the user plans to invest or since the first year the fund existed, whichever is shorter
 def CalculateAvgDividend(Ticker, Years_to_invest):
-    # get the historical dividends
-    dividends = pd.DataFrame(quarterlyDividends(Ticker))
-    # find the first year the stock existed
-    first_year = dividends.iloc[0]
-    first_year = first_year['Date'].year
-    # determine which came first, the timespan the user plans to invest or the first year the fund existed, then determine the date of that 
-    years_invest = year-min(year-first_year, Years_to_invest)
-    years_invest = f'{years_invest}-01-01'
-    # get all of the dividends since that date
-    dividends = dividends[(dividends['Date']> years_invest)]
-    # find the average of those dividends
-    average_dividend = dividends['Dividends'].mean()
-    return average_dividend
-
-# function to calc avg cost per share for each ticker
-def CalculateAvgCostPerShare(Years_to_invest, Monthly_cost):
-    cost_per_share = pd.DataFrame(Monthly_cost)
-    # find the first year the stock existed
-    first_year = cost_per_share.iloc[0]
-    first_year = first_year['Date'].year
-    # determine which came first, the timespan the user plans to invest or the first year the fund existed, then determine the date of that 
-    years_invest = year-min(year-first_year, Years_to_invest)
-    years_invest = f'{years_invest}-01-01'
-    # find all of the cost per shares that have occured since that date
-    cost_per_share = cost_per_share[(cost_per_share['Date']>years_invest)]
-    # take the average of those values
-    average_cost = cost_per_share['Open'].mean()
-    return average_cost
+    return tickerStats(Ticker).averageDividend(Years_to_invest)
+
+# function to calc avg cost per share for each ticker over the same time span
+def CalculateAvgCostPerShare(Years_to_invest, Ticker):
+    return tickerStats(Ticker).averageCost(Years_to_invest)
 
 # how much is your current initial investment worth
 def calcCurrentWorth (Portfolio,Ticker,Monthly_cost):
     # get the data from the portfolio of the specific ticker
     quantity = Portfolio.loc[Portfolio['ticker'] == Ticker]['quantity']
-    # get the data of the start of each month for the data
-    cost_per_share = pd.DataFrame(Monthly_cost)
-    # find the most recent value
-    cost_per_share = cost_per_share.iloc[-1:]
+    # get the data of the start of each month for the data and find the most recent value
+    cost_per_share = float(Monthly_cost['Open'][-1])
     # multiply that most recent value by the quantity the user owns
-    current_value = cost_per_share['Open'].values[0]*quantity.values[0]
+    current_value = cost_per_share*quantity.values[0]
     return current_value
 
 # calculate the average annual interest rate of the individual stocks
-def interestRate(Years_to_invest,Monthly_cost):
-    # get a dataframe of the monthly costs for the specific ticker
-    cost_per_share = pd.DataFrame(Monthly_cost)
-    # make an empty list to hold our growth rates
-    GR = []
-    # find one year after the first year that the stock existed
-    first_year = cost_per_share.iloc[0]
-    first_year = first_year['Date'].year+1
-    # determine which happended first, the first year the stock existed or the number of years the user plans to invest
-    Years_to_invest = min(year-first_year, Years_to_invest)
-    # itereate through the number of year
-    for i in range (0,Years_to_invest):
-        # find the date of one year
-        old_date =f'{year-i}-12-01'
-        old_value = cost_per_share.loc[cost_per_share['Date']==old_date]
-        m=12
-        # determine if that dataframe from the first date is empty 
-        while old_value['Open'].empty:
-            # iterate through the months of the year till you find one with data
-            m = m-1
-            old_date = f'{year-i}-{m}-01'
-            old_value = cost_per_share.loc[cost_per_share['Date']==old_date]
-        # get the open value of that month        
-        old_value = old_value['Open'].values[0]
-        # find a year that is one year older than our previous year
-        j = i+1
-        older_date = f'{year-j}-m-01'
-        older_value = cost_per_share.loc[cost_per_share['Date']==older_date]
-        # determine if that dataframe is empty
-        while older_value['Open'].empty:
-            # iterate through the months of year till you find one with data
-            older_date = f'{year-j}-{m}-01'
-            older_value = cost_per_share.loc[cost_per_share['Date']==older_date]
-            m = m-1
-        # get the open value of that month
-        older_value = older_value['Open'].values[0]
-        # calculate the growth rate of that year
-        GR_i = (old_value/older_value)-1
-        # add the growth rate to our list
-        GR.append(GR_i)
-    # add all of the growth rates
-    sum_GR = sum(GR)
-    # divded that sum by the number of years
-    AAGR = sum_GR/Years_to_invest
-    return AAGR
+# each year's growth rate compares the last month of the year with a price to the same month of the year before
+def interestRate(Years_to_invest,Ticker):
+    return tickerStats(Ticker).averageGrowth(Years_to_invest)
 
 # calculate current portfolio worth 
 def currentPortfolioWorth(Portfolio):
     # make an empty list for each of our tickers current values to go into
     current_value = []
+    # fetch the history of all of the tickers at once
+    prefetch(Portfolio['ticker'])
     # iterate through all of the tickers in our portfolio
     for ticker in Portfolio['ticker']:
         # find the monthly cost of that ticker
@@ -141,76 +208,285 @@ def currentPortfolioWorth(Portfolio):
     portfolio_current_value = sum(current_value)
     return portfolio_current_value
 
+# gather the inputs the growth calculation needs for every ticker in the portfolio
+def projectionInputs (Portfolio,Monthly_investments,Years_to_invest):
+    # make empty lists to hold the values for each of the tickers
+    principal, contribution, interest, dividends, avg_cost = [], [], [], [], []
+    # fetch the history of all of the tickers at once
+    prefetch(Portfolio['ticker'])
+    with metrics.timer('stats'):
+        # itereate through each of the tickers and their respective percents in the portfolio
+        for ticker, percent in zip(Portfolio['ticker'], Portfolio['future_percents']):
+            monthly_cost = MonthlyCost(ticker)                                              # find the monthly cost for each ticker
+            principal.append(calcCurrentWorth(Portfolio,ticker,monthly_cost))              # find the current worth of the stock
+            contribution.append((percent/100)*Monthly_investments)                          # assign how much the user plans to invest in this stock per month
+            # a plan of zero years is only the first month so there is no growth to find
+            if Years_to_invest < 1:
+                interest.append(0.0)
+                dividends.append(0.0)
+                avg_cost.append(1.0)
+                continue
+            interest.append(interestRate(Years_to_invest,ticker))                           # find the growth rate of the stock
+            dividends.append(CalculateAvgDividend(ticker,Years_to_invest))                  # calculate the average dividends returned
+            avg_cost.append(CalculateAvgCostPerShare(Years_to_invest,ticker))               # calculate the average cost per share of the stock
+    # return each of the lists as a numpy array so they can be used as columns
+    return (np.array(principal, dtype=float), np.array(contribution, dtype=float), np.array(interest, dtype=float),
+            np.array(dividends, dtype=float), np.array(avg_cost, dtype=float))
+
+# project the worth of every ticker for every month at once
+# the worth follows amt[i] = amt[i-1]*growth[i] + monthly_contribution, where growth[i] includes the dividends every third month
+# which has the closed form amt[n] = P[n]*(principal + monthly_contribution*sum(1/P[k] for k=2..n)) with P[n] the product of growth[2..n]
+# give a start month to continue a projection, the principal is then the worth at that month and the months from the start month on are returned
+@metrics.timed('projection')
+def projectGrowth (Principal,Contribution,Interest,Dividends,Avg_cost,Months,Start_month=1):
+    compounding_period = 12                                                 # assign how often the interest will compound, 12 = monthly
+    dividends_compounding = 3                                               # the dividends compound quarterly
+    months = max(Months, Start_month)                                       # the principal is always the first month
+    # make the principal and monthly contribution into columns so each row is a ticker
+    principal = np.asarray(Principal, dtype=float)[:, None]
+    contribution = np.asarray(Contribution, dtype=float)[:, None]
+    # find the growth of every month after the start month, the dividends are only reinvested on every third month
+    month_number = np.arange(Start_month+1, months+1)
+    dividend_month = (month_number % dividends_compounding) == 0
+    growth = 1 + (np.asarray(Interest, dtype=float)[:, None]/compounding_period) \
+        + np.where(dividend_month, (np.asarray(Dividends, dtype=float)/np.asarray(Avg_cost, dtype=float))[:, None], 0.0)
+    # the cumulative product of the growth is how much one dollar from the start month is worth in each month
+    cumulative_growth = np.cumprod(growth, axis=1)
+    # the contributions made each month grow by the cumulative growth divided by the growth up to the month they were made
+    contributions = contribution*np.cumsum(1/cumulative_growth, axis=1)
+    # put the principal in the start month and the grown amounts for the rest of the months
+    amounts = np.empty((principal.shape[0], months-Start_month+1))
+    amounts[:, :1] = principal
+    amounts[:, 1:] = cumulative_growth*(principal + contributions)
+    return amounts
+
+# cache of the projection of each ticker, each ticker's projection only depends on its own inputs
+# so when one row of the table changes only that ticker is projected again
+class ProjectionCache:
+    def __init__(self, Max_entries):
+        self.max_entries = Max_entries
+        self.entries = OrderedDict()                                        # key -> worth of every month, oldest used first
+        self.lock = threading.Lock()
+
+    def get(self, Key):
+        with self.lock:
+            amounts = self.entries.get(Key)
+            if amounts is not None:
+                self.entries.move_to_end(Key)
+            return amounts
+
+    def put(self, Key, Amounts):
+        with self.lock:
+            self.entries[Key] = Amounts
+            self.entries.move_to_end(Key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+projection_cache = ProjectionCache(int(os.environ.get('PROJECTION_CACHE_ENTRIES', 1024)))
+
+# project the worth of every ticker, only projecting the tickers that are not cached
+# a cached projection that is too short is continued from its last month instead of starting again from month one
+# the inputs include the rates found from the price history, so a refreshed history gives a new key
+def projectPortfolio (Tickers,Principal,Contribution,Interest,Dividends,Avg_cost,Months):
+    months = max(Months, 1)
+    inputs = list(zip(Principal, Contribution, Interest, Dividends, Avg_cost))
+    keys = [(ticker,)+tuple(float(value) for value in row) for ticker, row in zip(Tickers, inputs)]
+    rows = [projection_cache.get(key) for key in keys]
+    # group the tickers that need projecting by the month they start from, new tickers start from month one
+    starts = {}
+    for k, amounts in enumerate(rows):
+        if amounts is None:
+            starts.setdefault(1, []).append(k)
+        elif len(amounts) < months:
+            starts.setdefault(len(amounts), []).append(k)
+    for start, group in starts.items():
+        principal = [inputs[k][0] if rows[k] is None else rows[k][-1] for k in group]
+        projected = projectGrowth(principal, *(np.array([inputs[k][i] for k in group], dtype=float) for i in range(1, 5)), months, start)
+        for k, amounts in zip(group, projected):
+            rows[k] = amounts if rows[k] is None else np.concatenate((rows[k], amounts[1:]))
+            projection_cache.put(keys[k], rows[k])
+    if len(rows) == 0:
+        return np.empty((0, months))
+    return np.vstack([amounts[:months] for amounts in rows])
+
 # make a function to predicted the growth of the portfolio
 def totalInvestmentPrediction (Portfolio,Monthly_investments,Years_to_invest):
-    # make a dataframe to hold the results for each of the tickers
-    results = pd.DataFrame(columns = ['Month', 'Amount','Ticker'])
-    # itereate through each of the tickers and their respective percents in the portfolio
-    for ticker, percent in zip(Portfolio['ticker'], Portfolio['future_percents']):
-        monthly_cost = MonthlyCost(ticker)                                  # find the monthly cost for each ticker
-        percents = percent/100                                              # divided the percents by 100 to get them on the correct scale
-        principal = calcCurrentWorth(Portfolio,ticker,monthly_cost)         # find the current worth of the stock
-        interest = interestRate(Years_to_invest,monthly_cost)        # find the growth rate of the stock
-        compounding_period = 12                                             # assign how often the interest will compound, 12 = monthly
-        months = Years_to_invest*compounding_period                         # assign how lond the user plans to invest for
-        monthly_contribution = percents*Monthly_investments                 # assign how much the user plans to invest in this stock per month
-        dividends = CalculateAvgDividend(ticker,Years_to_invest)                            # calculate the average dividends returned
-        dividends_compounding = 3                                           # the dividends compound quarterly
-        avg_cost_per_share = CalculateAvgCostPerShare(Years_to_invest,monthly_cost)  # calculate the average cost per share of the stock
-        # add the pricipal as the month one investment
-        results =  results.append({'Month': 1, 'Amount': principal, 'Ticker':ticker}, ignore_index = True)
-        # iterate through the months the user plans to invest for
-        for i in range(2,months+1):
-            # find the worth of the previous month
-            amt = results.iloc[-1:]
-            amt = amt['Amount'].values[0]
-            # determine if it is a month that dividends are reinvested or not
-            if (i%dividends_compounding)==0:
-                    total = amt+(amt*(interest/12))+monthly_contribution+((amt/avg_cost_per_share)*dividends)
-                    results =  results.append({'Month': i, 'Amount': total, 'Ticker':ticker}, ignore_index = True)
-            else:
-                    total = amt+(amt*(interest/12))+monthly_contribution
-                    results =  results.append({'Month': i, 'Amount': total, 'Ticker':ticker}, ignore_index = True)
+    # find the inputs for every ticker and project the ones that are not cached
+    amounts = projectPortfolio(Portfolio['ticker'], *projectionInputs(Portfolio,Monthly_investments,Years_to_invest), Years_to_invest*12)
+    tickers, months = amounts.shape
+    # make a dataframe with one row per ticker per month, in the same order as the tickers in the portfolio
+    results = pd.DataFrame({'Month': np.tile(np.arange(1, months+1), tickers),
+                            'Amount': amounts.ravel(),
+                            'Ticker': np.repeat(np.asarray(Portfolio['ticker'], dtype=object), months)})
     return results
 
 # now we need to add up all of the rows that have the same years
 def amountPeryear(Portfolio,Monthly_investments,Years_to_invest):
-    # calculate the total portfolio growth
-    total_portfolio = totalInvestmentPrediction(Portfolio,Monthly_investments,Years_to_invest)
-    # make a new dataframe to hold the year and amount that will be calculated
-    sum_portfolio = pd.DataFrame(columns = ['Year', 'Amount'])
-    # find the initail amount that the portfolio is worth
-    initial_invest = currentPortfolioWorth(Portfolio)
-    # append that amount to year 0 of the portfolio we created
-    sum_portfolio = sum_portfolio.append({'Year':0,'Amount':initial_invest},ignore_index=True)
-    # itereate throught the number of years to the user plans to invest
-    for i in range(1,Years_to_invest+1):
-        # find the sum of all of the months that are evenly divisible by 12, this is grouping our months
-        per_year = total_portfolio[total_portfolio['Month']==i*12]['Amount'].sum()
-        # append that amount to the portfolio with the number of years
-        sum_portfolio =  sum_portfolio.append({'Year': i, 'Amount': per_year}, ignore_index = True)
+    # calculate the total portfolio growth for every ticker and month, only the tickers that changed are projected again
+    amounts = projectPortfolio(Portfolio['ticker'], *projectionInputs(Portfolio,Monthly_investments,Years_to_invest), Years_to_invest*12)
+    # find the initail amount that the portfolio is worth, this is the sum of the month one amounts
+    initial_invest = amounts[:, 0].sum()
+    with metrics.timer('aggregation'):
+        # group the months into years and sum the last month of each year over all of the tickers
+        per_year = amounts[:, :Years_to_invest*12].reshape(amounts.shape[0], Years_to_invest, 12)[:, :, -1].sum(axis=0)
+        # make a dataframe with the year and amount, with the initial amount as year 0
+        sum_portfolio = pd.DataFrame({'Year': np.arange(0, Years_to_invest+1),
+                                      'Amount': np.concatenate(([initial_invest], per_year))})
     return sum_portfolio
 
+# find the predicted worth at the end of the plan for every pair of monthly investment and years in a grid
+# the worth is linear in the monthly investment, worth = principal_path + monthly*unit_path, so each number of years is projected
+# once for the principal with no monthly investment and once for one dollar a month with no principal, then the grid is filled in from those
+# every number of years is projected in one pass, each has its own rows with its own rates and its worth is read at the year its plan ends
+@metrics.timed('sweep')
+def sweepGrid (Portfolio,Monthly_amounts,Years):
+    tickers = list(Portfolio['ticker'])
+    years = list(Years)
+    prefetch(tickers)
+    # the current worth of each ticker and how much of each dollar invested per month goes to it
+    principal = np.array([calcCurrentWorth(Portfolio,ticker,MonthlyCost(ticker)) for ticker in tickers], dtype=float)
+    unit = np.asarray(Portfolio['future_percents'], dtype=float)/100
+    zeros = np.zeros(len(tickers))
+    # the rates use the same number of years of history as the plan, found for every plan at once, rates[plan, ticker, statistic]
+    rates = np.array([np.stack(tickerStats(ticker).averages(years), axis=-1) for ticker in tickers])
+    rates = rates.reshape(len(tickers), len(years), 3).transpose(1, 0, 2)
+    # a plan whose rates can't be found is left empty, like one year in january before the first price of the year is known
+    found = np.flatnonzero(np.isfinite(rates).all(axis=(1, 2)))
+    principal_worth = np.full(len(years), np.nan)
+    unit_worth = np.full(len(years), np.nan)
+    if len(found):
+        # each plan has a block of rows, the principal of every ticker then one dollar a month for every ticker
+        rates = np.concatenate((rates[found], rates[found]), axis=1).reshape(-1, 3)
+        starts = np.tile(np.concatenate((principal, zeros)), len(found))
+        contributions = np.tile(np.concatenate((zeros, unit)), len(found))
+        plan_years = np.asarray(years)[found]
+        worth = yearEnds(starts, contributions, rates[:, 0], rates[:, 1], rates[:, 2], np.repeat(plan_years, 2*len(tickers)))
+        worth = worth.reshape(len(found), 2, len(tickers)).sum(axis=2)
+        principal_worth[found] = worth[:, 0]
+        unit_worth[found] = worth[:, 1]
+    grid = principal_worth[:, None] + unit_worth[:, None]*np.asarray(Monthly_amounts, dtype=float)[None, :]
+    return pd.DataFrame(grid, index=pd.Index(years, name='Year'), columns=pd.Index(list(Monthly_amounts), name='Monthly'))
+
+# find the worth of every row at the end of its own number of years, the same as the last month of projectGrowth for that many years
+# the dividends are every third month so every year after the first has the same months, and a year of the plan turns
+# the worth at the start of the year w into w*year_growth + contribution*year_contribution, so the plans are stepped a year at a time
+def yearEnds (Principal,Contribution,Interest,Dividends,Avg_cost,Years):
+    rows = len(Principal)
+    years = np.asarray(Years)
+    rates = (np.tile(Interest, 2), np.tile(Dividends, 2), np.tile(Avg_cost, 2))
+    # the first year is months 2 to 12 from the principal in month 1, the later years are 12 months from the end of the year before
+    # the first half of the rows grows one dollar with no contribution and the second half is one dollar a month from nothing
+    unit_rows = (np.repeat([1.0, 0.0], rows), np.repeat([0.0, 1.0], rows))
+    first_year = projectGrowth(*unit_rows, *rates, 12)[:, -1]
+    later_year = projectGrowth(*unit_rows, *rates, 24, 12)[:, -1]
+    growth, contribution = later_year[:rows], later_year[rows:]*Contribution
+    worth = first_year[:rows]*Principal + first_year[rows:]*Contribution
+    # a plan of zero years is the principal
+    year_ends = np.where(years < 1, Principal, worth)
+    for year in range(2, int(np.max(years, initial=1))+1):
+        worth = worth*growth + contribution
+        year_ends = np.where(years == year, worth, year_ends)
+    return year_ends
+
+# call a function that finds a statistic and make the result something that can be sent as json, None if it can't be found
+def jsonNumber (Function, *args):
+    try:
+        value = float(Function(*args))
+    except (ArithmeticError, IndexError, ValueError):
+        return None
+    return value if np.isfinite(value) else None
+
+# the statistics of each ticker for every lookback, sent to the browser once so it can preview the projection without the server
+# the lists stop at the lookback that covers the whole history since the statistics are the same for any longer lookback
+def previewStats (Tickers):
+    tickers = [ticker for ticker in Tickers if isinstance(ticker, str) and ticker]
+    prefetch(tickers)
+    stats = {}
+    for ticker in tickers:
+        try:
+            index = tickerStats(ticker)
+        except Exception:
+            # leave out tickers that can't be fetched, the server will report them on submit
+            continue
+        if index.first_month_year is None:
+            continue
+        lookbacks = range(1, min(max(index.current_year - index.first_month_year, 1), 100)+1)
+        stats[ticker] = {'current_cost': index.current_cost,
+                         'rate': [jsonNumber(index.averageGrowth, years) for years in lookbacks],
+                         'dividend': [jsonNumber(index.averageDividend, years) for years in lookbacks],
+                         'avg_cost': [jsonNumber(index.averageCost, years) for years in lookbacks]}
+    return stats
+
+# find the monthly returns of every ticker over the months they all have history for
+# each row is a month, sampling whole rows keeps how the tickers move together
+def commonReturns (Tickers,Years_to_invest):
+    histories = [tickerStats(ticker).monthlyReturns(Years_to_invest) for ticker in Tickers]
+    # the months every ticker has a return for
+    first_month = max(months[0] for months, returns in histories if len(months)) if all(len(months) for months, returns in histories) else None
+    last_month = min(months[-1] for months, returns in histories) if first_month is not None else None
+    if first_month is None or first_month > last_month:
+        raise ValueError('the tickers do not have any months of history in common')
+    return np.column_stack([returns[(months >= first_month) & (months <= last_month)] for months, returns in histories])
+
+# simulate the growth of one chunk of paths, this is at the top of the module so it can run in a process pool
+# returns the total worth of the portfolio at the end of each year for each path
+def simulatePaths (Returns,Principal,Contribution,Dividend_yield,Months,Paths,Seed):
+    rng = np.random.default_rng(Seed)
+    dividends_compounding = 3                                               # the dividends compound quarterly
+    # every path starts with the principal of each ticker
+    amounts = np.tile(Principal, (Paths, 1))
+    totals = np.empty((Paths, Months//12))
+    for i in range(2, Months+1):
+        # pick a month of history for each path, all of the tickers use the same month
+        growth = 1 + Returns[rng.integers(0, len(Returns), Paths)]
+        # the dividends are reinvested every third month
+        if (i % dividends_compounding) == 0:
+            growth += Dividend_yield
+        amounts *= growth
+        amounts += Contribution
+        # keep the total at the end of each year
+        if (i % 12) == 0:
+            totals[:, i//12-1] = amounts.sum(axis=1)
+    return totals
+
+# simulate the growth of the portfolio many times by sampling the monthly returns from the history of the tickers
+# returns the 5th, 50th and 95th percentile of the portfolio worth at the end of each year
+@metrics.timed('simulation')
+def simulateGrowth (Portfolio,Monthly_investments,Years_to_invest,Paths=10000,Seed=None,Processes=1):
+    principal, contribution, interest, dividends, avg_cost = projectionInputs(Portfolio,Monthly_investments,Years_to_invest)
+    returns = commonReturns(Portfolio['ticker'],Years_to_invest)
+    # the dividends as a fraction of the cost per share
+    dividend_yield = dividends/avg_cost
+    months = Years_to_invest*12
+    # split the paths into chunks that each get their own random numbers
+    chunks = max(Processes, 1)
+    sizes = [len(chunk) for chunk in np.array_split(np.arange(Paths), chunks)]
+    seeds = np.random.SeedSequence(Seed).spawn(chunks)
+    arguments = [(returns, principal, contribution, dividend_yield, months, size, seed) for size, seed in zip(sizes, seeds)]
+    if chunks > 1:
+        with ProcessPoolExecutor(max_workers=chunks) as pool:
+            totals = list(pool.map(simulatePaths, *zip(*arguments)))
+    else:
+        totals = [simulatePaths(*arguments[0])]
+    totals = np.concatenate(totals)
+    # find the percentiles of every year, year 0 is the current worth
+    bands = np.percentile(totals, [5, 50, 95], axis=0)
+    initial_invest = principal.sum()
+    simulation = pd.DataFrame({'Year': np.arange(0, Years_to_invest+1),
+                               'P5': np.concatenate(([initial_invest], bands[0])),
+                               'P50': np.concatenate(([initial_invest], bands[1])),
+                               'P95': np.concatenate(([initial_invest], bands[2]))})
+    return simulation
+
 # add a column of what money we put in to the portfolio dataframe
 def compareInvestedtoGrowth(Total_investment, Portfolio, Monthly_investment, Years_to_invest):
     # calculate what the user invests per year
     yearly_investment = Monthly_investment*12
-    # find the current worth of the user's portfolio
-    portfolio_worth = currentPortfolioWorth(Portfolio)
-    # create a empty list to hold the amount invested per year
-    money_inv = []
-    # insert the worth at time 0 into the list
-    money_inv.insert(0,portfolio_worth)
-    # insert the worth at year 1 into the portfolio
-    money_inv.insert(1,portfolio_worth+yearly_investment)
-    # iterate through the number of years the user plans to invest
-    for i in range(2,Years_to_invest+1):
-        # create a new variable that holds the amount invested last year
-        last_year_amt = money_inv[i-1]
-        # add the last year investment to the yearly investment to determine the total amount invested at the end of this year
-        this_year_amt = last_year_amt + yearly_investment
-        # insert that value into the correct year
-        money_inv.insert(i,this_year_amt)
+    # find the current worth of the user's portfolio, this is the year 0 amount of the prediction
+    portfolio_worth = Total_investment['Amount'].values[0]
+    # the amount invested at the end of each year, the worth at time 0 plus what was invested each year since
+    # there is one entry for every year of the prediction, a plan of zero years only has the worth at time 0
+    money_inv = [portfolio_worth + yearly_investment*i for i in range(Years_to_invest+1)]
     # add the list we created with all of the yearly investments to the total investments dataframe
     Total_investment.insert(2,'Money_Invested',money_inv,True)
     return Total_investment
\ No newline at end of file
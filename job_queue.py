@@ -0,0 +1,81 @@
+# background jobs for the long projections so a request never runs into the gunicorn timeout
+# the Submit callback runs in a separate process and the page polls it for progress, the results are kept in a diskcache directory
+# set JOB_CACHE_DIR to turn the background jobs on, every gunicorn worker that uses the same directory shares the jobs and results
+# libraries
+import time
+from dash import DiskcacheManager
+from price_cache import previousMarketClose
+
+# the job of inputs whose process is being started, other submissions wait for the process instead of starting one
+starting = 'starting'
+# how long a job can take to start, after this the inputs are free again in case the worker starting it died
+starting_seconds = 10
+
+# job manager that only runs one job for the same inputs at a time
+# a submission with the same inputs as a job that is running is attached to that job instead of starting another one,
+# and a finished result is served again until the next market close brings new prices
+class ProjectionJobManager(DiskcacheManager):
+    def __init__(self, Directory, Expire=24*60*60):
+        try:
+            import diskcache
+        except ImportError:
+            raise ImportError('diskcache, multiprocess and psutil are needed for background jobs, install them or unset JOB_CACHE_DIR')
+        # the prices only change after the market closes so the results are cached until then
+        super().__init__(diskcache.Cache(Directory), cache_by=[previousMarketClose], expire=Expire)
+
+    # the job that is running for a set of inputs
+    def jobKey(self, Key):
+        return f'{Key}-job'
+
+    # how many submissions are waiting on a job
+    def watchersKey(self, Job):
+        return f'job-{Job}-watchers'
+
+    # start a job for the inputs unless one is already running or the result is cached, returns the job
+    def call_job_fn(self, key, job_fn, args, context):
+        while True:
+            with self.handle.transact():
+                # job 0 is never a process, the first poll finds the cached result
+                if self.result_ready(key):
+                    return 0
+                job = self.handle.get(self.jobKey(key))
+                if job is not None and job != starting and self.job_running(job):
+                    self.handle.incr(self.watchersKey(job), 1, default=0)
+                    return job
+                # claim the inputs so the other workers wait for this job instead of starting their own
+                if job != starting:
+                    self.handle.set(self.jobKey(key), starting, expire=starting_seconds)
+                    break
+            time.sleep(0.05)
+        # start the process outside the transaction so it doesn't inherit the open transaction and the other workers aren't blocked
+        try:
+            job = super().call_job_fn(key, job_fn, args, context)
+        except BaseException:
+            self.handle.delete(self.jobKey(key))
+            raise
+        with self.handle.transact():
+            self.handle.set(self.watchersKey(job), 1, expire=self.expire)
+            self.handle.set(self.jobKey(key), job, expire=self.expire)
+        return job
+
+    def job_running(self, job):
+        return int(job) > 0 and super().job_running(job)
+
+    # called when a submission is cancelled, replaced by a new submission or has its result
+    # a job shared by more than one submission keeps running until all of them have let go of it
+    def terminate_job(self, job):
+        if job is None or int(job) <= 0:
+            return
+        with self.handle.transact():
+            watchers = self.handle.incr(self.watchersKey(int(job)), -1, default=1)
+            if watchers <= 0:
+                self.handle.delete(self.watchersKey(int(job)))
+        if watchers <= 0:
+            super().terminate_job(job)
+
+    # a job that failed isn't cached so the next submission tries again
+    def get_result(self, key, job):
+        result = super().get_result(key, job)
+        if isinstance(result, dict) and 'background_callback_error' in result:
+            self.clear_cache_entry(key)
+        return result
@@ -0,0 +1,143 @@
+# providers of the daily price history of tickers
+# every provider gives the history of a batch of tickers between two dates, a dataframe for each ticker with the yahoo finance columns
+# set MARKET_DATA_PROVIDER to choose one:
+#   yfinance  - download from yahoo finance (the default)
+#   directory - read <ticker>.csv or <ticker>.parquet files from MARKET_DATA_DIR
+#   fixture   - replay histories recorded in MARKET_DATA_DIR, set MARKET_DATA_RECORD=1 to record them from yahoo finance first
+# libraries
+import os
+import pandas as pd
+import yfinance as yf
+from urllib.parse import quote
+
+# the columns the model uses, the rest of the yahoo finance columns are dropped
+history_columns = ['Date', 'Open', 'Dividends', 'Stock Splits']
+# the columns every history needs, a history without the others is treated as having no dividends or splits
+required_columns = ['Date', 'Open']
+
+# function to make the history of a ticker that doesn't exist
+def emptyHistory ():
+    return pd.DataFrame({name: [] for name in history_columns})
+
+# function to keep the columns the model uses with the dates as the local day of the exchange
+def trimHistory (Ticker_data):
+    if 'Date' not in Ticker_data or len(Ticker_data) == 0:
+        return emptyHistory()
+    missing = [name for name in required_columns if name not in Ticker_data]
+    if missing:
+        raise ValueError(f"the price history is missing the {', '.join(missing)} column, it needs {', '.join(required_columns)}")
+    # plain price files like ohlcv csv files don't have the dividends and splits
+    ticker_data = Ticker_data.reindex(columns=history_columns, fill_value=0.0)
+    dates = ticker_data['Date']
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        # dates read from a file keep the utc offset of the exchange, drop it so the day doesn't change
+        dates = pd.to_datetime(dates.astype(str).str.replace(r'[+-]\d\d:\d\d$', '', regex=True))
+    elif getattr(dates.dt, 'tz', None) is not None:
+        dates = dates.dt.tz_localize(None)
+    ticker_data['Date'] = dates
+    return ticker_data.reset_index(drop=True)
+
+# function to keep the days from Start up to but not including End, like yahoo finance does
+def dateRange (Ticker_data, Start=None, End=None):
+    keep = pd.Series(True, index=Ticker_data.index)
+    if Start is not None:
+        keep &= Ticker_data['Date'] >= pd.Timestamp(Start)
+    if End is not None:
+        keep &= Ticker_data['Date'] < pd.Timestamp(End)
+    return Ticker_data[keep].reset_index(drop=True)
+
+# the interface every provider has
+class MarketDataProvider:
+    # the history of each ticker from Start to End, a dictionary of ticker -> dataframe
+    # Start and End are dates or None for the first and last day there is
+    def history(self, Tickers, Start=None, End=None):
+        raise NotImplementedError
+
+# download the history from yahoo finance
+class YahooFinanceProvider(MarketDataProvider):
+    def history(self, Tickers, Start=None, End=None):
+        histories = {}
+        for ticker in Tickers:
+            ticker_data = yf.Ticker(ticker)
+            # only ask for the days that are needed, the whole history of an old ticker is a lot bigger
+            if Start is None and End is None:
+                ticker_data = pd.DataFrame(ticker_data.history(period = 'max'))
+            else:
+                ticker_data = pd.DataFrame(ticker_data.history(start = Start, end = End))
+            ticker_data.reset_index(inplace = True)
+            histories[ticker] = trimHistory(ticker_data)
+        return histories
+
+# read the history from a directory with a csv or parquet file for each ticker
+class DirectoryProvider(MarketDataProvider):
+    def __init__(self, Directory):
+        self.directory = Directory
+
+    # the file of a ticker, the ticker is quoted so tickers like ^GSPC make valid names
+    def path(self, Ticker, Extension):
+        return os.path.join(self.directory, quote(Ticker, safe='') + Extension)
+
+    # read the whole file of a ticker, returns None if there isn't one
+    def read(self, Ticker):
+        if os.path.exists(self.path(Ticker, '.parquet')):
+            return trimHistory(pd.read_parquet(self.path(Ticker, '.parquet')))
+        if os.path.exists(self.path(Ticker, '.csv')):
+            return trimHistory(pd.read_csv(self.path(Ticker, '.csv')))
+        return None
+
+    # a ticker without a file is treated like a ticker that doesn't exist
+    def missing(self, Ticker):
+        return emptyHistory()
+
+    def history(self, Tickers, Start=None, End=None):
+        histories = {}
+        for ticker in Tickers:
+            ticker_data = self.read(ticker)
+            histories[ticker] = self.missing(ticker) if ticker_data is None else dateRange(ticker_data, Start, End)
+        return histories
+
+# replay histories recorded to a directory so the app and the benchmarks can run without yahoo finance
+# when recording every fetch goes to the source and what it returns is added to the recorded csv files
+class FixtureProvider(DirectoryProvider):
+    def __init__(self, Directory, Record=False, Source=None):
+        super().__init__(Directory)
+        self.recording = Record
+        self.source = Source or YahooFinanceProvider()
+        if Record:
+            os.makedirs(Directory, exist_ok=True)
+
+    # a ticker that wasn't recorded is an error so a missing fixture doesn't look like a ticker that doesn't exist
+    def missing(self, Ticker):
+        raise LookupError(f'no recorded history for {Ticker} in {self.directory}, record it with MARKET_DATA_RECORD=1')
+
+    # add the fetched days to the recorded days of a ticker
+    def save(self, Ticker, Ticker_data):
+        recorded = self.read(Ticker)
+        if recorded is not None and len(recorded):
+            Ticker_data = pd.concat([recorded, Ticker_data]) if len(Ticker_data) else recorded
+            Ticker_data = Ticker_data.drop_duplicates('Date', keep='last').sort_values('Date')
+        # write to a temporary file first so a replay never reads half a file
+        temp_path = self.path(Ticker, '.csv.tmp')
+        Ticker_data.to_csv(temp_path, index=False)
+        os.replace(temp_path, self.path(Ticker, '.csv'))
+
+    def history(self, Tickers, Start=None, End=None):
+        if not self.recording:
+            return super().history(Tickers, Start, End)
+        histories = self.source.history(Tickers, Start, End)
+        for ticker, ticker_data in histories.items():
+            self.save(ticker, ticker_data)
+        return histories
+
+# function to make the provider chosen by the environment variables
+def providerFromConfig ():
+    name = os.environ.get('MARKET_DATA_PROVIDER', 'yfinance')
+    if name == 'yfinance':
+        return YahooFinanceProvider()
+    if name in ('directory', 'fixture') and not os.environ.get('MARKET_DATA_DIR'):
+        raise ValueError(f'MARKET_DATA_DIR is needed for the {name} market data provider')
+    if name == 'directory':
+        return DirectoryProvider(os.environ['MARKET_DATA_DIR'])
+    if name == 'fixture':
+        return FixtureProvider(os.environ['MARKET_DATA_DIR'], Record = os.environ.get('MARKET_DATA_RECORD', '0') == '1')
+    raise ValueError(f'unknown MARKET_DATA_PROVIDER {name}, use yfinance, directory or fixture')
@@ -0,0 +1,166 @@
+# timing and counters for the dash callbacks and the data fetches
+# the metrics are served in the prometheus text format at /metrics and each callback writes one structured log line
+# set METRICS_ENABLED=0 to turn all of it off, the timers are then replaced by functions that do nothing
+# libraries
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+
+enabled = os.environ.get('METRICS_ENABLED', '1') != '0'
+
+# the upper bounds in seconds of the histogram buckets
+buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# the request id and the time spent in each stage of the callback that is running
+request_id = contextvars.ContextVar('request_id', default=None)
+request_stages = contextvars.ContextVar('request_stages', default=None)
+# the threads that prefetch the tickers of a callback add to the same stages, so the stages are changed under a lock
+stages_lock = threading.Lock()
+
+# structured logger, every line is a json object that includes the request id
+logger = logging.getLogger('portfolio')
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        line = {'time': self.formatTime(record), 'level': record.levelname, 'message': record.getMessage(),
+                'request_id': request_id.get()}
+        line.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            line['error'] = self.formatException(record.exc_info)
+        return json.dumps(line, default=str)
+
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(os.environ.get('LOG_LEVEL', 'INFO'))
+    logger.propagate = False
+
+# histogram of how long something took, with a separate set of buckets for each value of the label
+class Histogram:
+    def __init__(self, Name, Help, Label):
+        self.name = Name
+        self.help = Help
+        self.label = Label
+        self.series = {}                                        # label value -> [bucket counts, sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, Label_value, Seconds):
+        with self.lock:
+            series = self.series.get(Label_value)
+            if series is None:
+                series = self.series[Label_value] = [[0]*len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if Seconds <= bound:
+                    series[0][i] += 1
+            series[1] += Seconds
+            series[2] += 1
+
+    # the lines of the prometheus text format
+    def lines(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        with self.lock:
+            for value, (counts, total, count) in sorted(self.series.items()):
+                label = f'{self.label}="{value}"'
+                for bound, bucket_count in zip(buckets, counts):
+                    yield f'{self.name}_bucket{{{label},le="{bound}"}} {bucket_count}'
+                yield f'{self.name}_bucket{{{label},le="+Inf"}} {count}'
+                yield f'{self.name}_sum{{{label}}} {total}'
+                yield f'{self.name}_count{{{label}}} {count}'
+
+callback_seconds = Histogram('portfolio_callback_seconds', 'Time spent in each dash callback.', 'callback')
+stage_seconds = Histogram('portfolio_stage_seconds', 'Time spent in each stage of the model.', 'stage')
+
+# functions that return more prometheus lines when /metrics is read, used for counters kept somewhere else like the cache stats
+collectors = []
+
+def addCollector (Collector):
+    collectors.append(Collector)
+
+# record how long a stage took, for the histogram and for the log line of the callback that is running
+def record (Stage, Seconds):
+    stage_seconds.observe(Stage, Seconds)
+    stages = request_stages.get()
+    if stages is not None:
+        with stages_lock:
+            stages[Stage] = stages.get(Stage, 0.0) + Seconds
+
+@contextmanager
+def stageTimer (Stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(Stage, time.perf_counter()-start)
+
+# time a block of code as a stage
+def timer (Stage):
+    return stageTimer(Stage) if enabled else nullcontext()
+
+# decorator to time a function as a stage
+def timed (Stage):
+    def decorator(Function):
+        if not enabled:
+            return Function
+        @functools.wraps(Function)
+        def wrapper(*args, **kwargs):
+            with stageTimer(Stage):
+                return Function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# find the request id from the X-Request-ID header, or make a new one
+def newRequestId ():
+    try:
+        from flask import request
+        header = request.headers.get('X-Request-ID')
+    except (ImportError, RuntimeError):
+        header = None
+    return header or uuid.uuid4().hex[:16]
+
+# decorator for dash callbacks, times the callback and each of its stages and writes a log line with a request id
+def timedCallback (Name):
+    def decorator(Function):
+        if not enabled:
+            return Function
+        @functools.wraps(Function)
+        def wrapper(*args, **kwargs):
+            id_token = request_id.set(newRequestId())
+            stages_token = request_stages.set({})
+            start = time.perf_counter()
+            status = 'error'
+            try:
+                result = Function(*args, **kwargs)
+                status = 'ok'
+                return result
+            finally:
+                seconds = time.perf_counter()-start
+                callback_seconds.observe(Name, seconds)
+                with stages_lock:
+                    stages = {stage: round(value, 6) for stage, value in request_stages.get().items()}
+                logger.info('callback finished', extra={'fields': {'callback': Name, 'status': status,
+                                                                   'duration_s': round(seconds, 6), 'stages_s': stages}})
+                request_stages.reset(stages_token)
+                request_id.reset(id_token)
+        return wrapper
+    return decorator
+
+# all of the metrics in the prometheus text format
+def exposition ():
+    lines = list(callback_seconds.lines()) + list(stage_seconds.lines())
+    for collector in collectors:
+        lines.extend(collector())
+    return '\n'.join(lines) + '\n'
+
+# add the /metrics endpoint to the flask server
+def register (Server):
+    @Server.route('/metrics')
+    def metricsEndpoint():
+        return exposition(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
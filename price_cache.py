@@ -0,0 +1,291 @@
+# cache for the price history of each ticker
+# libraries
+import contextlib
+import contextvars
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from urllib.parse import quote
+from zoneinfo import ZoneInfo
+try:
+    import fcntl
+except ImportError:
+    # windows doesn't have file locks like this, there each worker loads the keys it is missing
+    fcntl = None
+
+# market information, the prices only change once the market closes
+market_timezone = ZoneInfo('America/New_York')
+market_close_hour = 16
+# wait a little after the close so the data provider has the closing data
+market_close_delay = timedelta(minutes=30)
+
+# function to find when the next market close after a given time happens, this is when cached prices go stale
+def nextMarketClose (Now=None):
+    # use the current time if a time was not given
+    now = datetime.now(market_timezone) if Now is None else datetime.fromtimestamp(Now, market_timezone)
+    # find the close for today
+    close = now.replace(hour=market_close_hour, minute=0, second=0, microsecond=0) + market_close_delay
+    # if today's close has already happened move on to tomorrow
+    if close <= now:
+        close = close + timedelta(days=1)
+    # skip saturday and sunday since the market is closed
+    while close.weekday() >= 5:
+        close = close + timedelta(days=1)
+    return close.timestamp()
+
+# function to find when the most recent market close before a given time happened, prices fetched after it are current
+def previousMarketClose (Now=None):
+    # use the current time if a time was not given
+    now = datetime.now(market_timezone) if Now is None else datetime.fromtimestamp(Now, market_timezone)
+    # find the close for today
+    close = now.replace(hour=market_close_hour, minute=0, second=0, microsecond=0) + market_close_delay
+    # if today's close hasn't happened yet move back to yesterday
+    if close > now:
+        close = close - timedelta(days=1)
+    # skip saturday and sunday since the market is closed
+    while close.weekday() >= 5:
+        close = close - timedelta(days=1)
+    return close.timestamp()
+
+# function to estimate how many bytes a cached value uses
+def sizeOf (Value):
+    # dataframes can tell us how much memory they use
+    if hasattr(Value, 'memory_usage'):
+        return int(Value.memory_usage(index=True, deep=True).sum())
+    # numpy arrays and anything else with an nbytes attribute
+    if hasattr(Value, 'nbytes'):
+        return int(Value.nbytes)
+    # otherwise use the size of the pickled value
+    return len(pickle.dumps(Value, protocol=pickle.HIGHEST_PROTOCOL))
+
+# on-disk tier of the cache, this is a directory of pickle files so every gunicorn worker can share them
+class DiskTier:
+    def __init__(self, Directory):
+        self.directory = Directory
+        os.makedirs(Directory, exist_ok=True)
+
+    # find the file that holds a key, the key is quoted so tickers like ^GSPC make valid file names
+    def path(self, Key):
+        return os.path.join(self.directory, quote(Key, safe='') + '.pkl')
+
+    # the lock file of a key
+    def lockPath(self, Key):
+        return os.path.join(self.directory, quote(Key, safe='') + '.lock')
+
+    # hold the lock of a key so only one worker loads it at a time, the others wait and then read what it wrote
+    @contextlib.contextmanager
+    def locked(self, Key):
+        if fcntl is None:
+            yield
+            return
+        path = self.lockPath(Key)
+        while True:
+            file = open(path, 'a')
+            fcntl.flock(file, fcntl.LOCK_EX)
+            # the sweep may have removed the lock file while we waited for it, then lock the new one
+            try:
+                if os.fstat(file.fileno()).st_ino == os.stat(path).st_ino:
+                    break
+            except OSError:
+                pass
+            file.close()
+        try:
+            yield
+        finally:
+            # closing the file lets go of the lock
+            file.close()
+
+    # remove the lock file of a key that isn't stored, a lock file that is in use is left alone
+    def discardLock(self, Path):
+        if fcntl is None:
+            return
+        try:
+            with open(Path, 'a') as file:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self.discard(Path)
+        except OSError:
+            pass
+
+    # get a value and when it expires from the disk, returns None if it isn't there or has expired
+    def get(self, Key, Now):
+        try:
+            with open(self.path(Key), 'rb') as file:
+                expires, value = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        # an expired file is removed so tickers that are no longer used don't pile up on the disk
+        if expires <= Now:
+            self.discard(self.path(Key))
+            return None
+        return expires, value
+
+    # write a value to the disk, write to a temporary file first so other workers never read half a file
+    # the modified time of the file is set to when it expires so the expired files can be found without reading them
+    def put(self, Key, Value, Expires):
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                pickle.dump((Expires, Value), file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.utime(temp_path, (Expires, Expires))
+            os.replace(temp_path, self.path(Key))
+        except OSError:
+            # the disk tier is optional, if it can't be written just keep the value in memory
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self.sweep(time.time())
+
+    # remove a file, another worker may have already removed it
+    @staticmethod
+    def discard(Path):
+        try:
+            os.remove(Path)
+        except OSError:
+            pass
+
+    # remove every file that has expired and the lock files of the keys that aren't stored
+    def sweep(self, Now):
+        names = os.listdir(self.directory)
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if name.endswith('.pkl') and os.stat(path).st_mtime <= Now:
+                    self.discard(path)
+            except OSError:
+                pass
+        for name in names:
+            if name.endswith('.lock') and not os.path.exists(os.path.join(self.directory, name[:-len('.lock')] + '.pkl')):
+                self.discardLock(os.path.join(self.directory, name))
+
+    # remove everything from the disk
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.pkl'):
+                self.discard(os.path.join(self.directory, name))
+
+# least recently used cache with a size limit in bytes where every entry expires at the next market close
+class PriceCache:
+    def __init__(self, Loader, Max_bytes, Disk_dir=None, Expires=nextMarketClose):
+        self.loader = Loader                                    # function to call when a key is not in the cache
+        self.max_bytes = Max_bytes                              # the most bytes the in memory entries can use
+        self.expires = Expires                                  # function that gives when an entry fetched now goes stale
+        self.disk = DiskTier(Disk_dir) if Disk_dir else None    # optional tier shared by all of the workers
+        self.entries = OrderedDict()                            # key -> (expires, size, value), oldest used first
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.loading = {}                                       # key -> future of the load in progress, so a key is only loaded once at a time
+        self.counts = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'shared_loads': 0}
+
+    # get the value for a key, loading it if it is not cached or has expired
+    def get(self, Key):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(Key)
+            if entry is not None:
+                # the entry is still good, mark it as the most recently used
+                if entry[0] > now:
+                    self.entries.move_to_end(Key)
+                    self.counts['hits'] += 1
+                    return entry[2]
+                # the entry is stale so throw it away
+                self.remove(Key)
+                self.counts['expirations'] += 1
+            # if another thread is already loading this key wait for it instead of loading it again
+            future = self.loading.get(Key)
+            if future is not None:
+                self.counts['shared_loads'] += 1
+            else:
+                self.loading[Key] = Future()
+        if future is not None:
+            return future.result()
+        try:
+            value = self.load(Key, now)
+        except BaseException as error:
+            with self.lock:
+                future = self.loading.pop(Key)
+            future.set_exception(error)
+            raise
+        with self.lock:
+            future = self.loading.pop(Key)
+        future.set_result(value)
+        return value
+
+    # load a value from the disk tier or the loader and add it to the memory tier
+    def load(self, Key, Now):
+        if self.disk:
+            # look for the value on the disk before loading it
+            stored = self.disk.get(Key, Now)
+            if stored is None:
+                # every worker's warmer wakes at the same market close, so only one of them loads each key
+                with self.disk.locked(Key):
+                    # another worker may have loaded the key while this one waited for the lock
+                    stored = self.disk.get(Key, time.time())
+                    if stored is None:
+                        value, expires = self.loadFromSource(Key, Now)
+                        self.disk.put(Key, value, expires)
+        else:
+            stored = None
+            value, expires = self.loadFromSource(Key, Now)
+        if stored is not None:
+            expires, value = stored
+            with self.lock:
+                self.counts['disk_hits'] += 1
+        self.put(Key, value, expires)
+        return value
+
+    # call the loader for a key, returns the value and when it expires
+    def loadFromSource(self, Key, Now):
+        value = self.loader(Key)
+        with self.lock:
+            self.counts['misses'] += 1
+        return value, self.expires(Now)
+
+    # load all of the keys that are not cached at the same time, errors are left for when the key is used
+    # give Done to be called with each key as it finishes loading, a key that failed is reported too and fails again when it is used
+    def prefetch(self, Keys, Max_workers, Done=None):
+        keys = list(dict.fromkeys(Keys))
+        if len(keys) == 0:
+            return
+        with ThreadPoolExecutor(max_workers=min(Max_workers, len(keys))) as pool:
+            # run each load in a copy of the caller's context so the request id follows it into the thread
+            futures = {pool.submit(contextvars.copy_context().run, self.get, key): key for key in keys}
+            for future in as_completed(futures):
+                if Done is not None:
+                    Done(futures[future])
+
+    # add a value to the memory tier and evict the least recently used entries until it fits
+    def put(self, Key, Value, Expires):
+        size = sizeOf(Value)
+        with self.lock:
+            if Key in self.entries:
+                self.remove(Key)
+            # a value bigger than the whole cache is returned but not kept
+            if size > self.max_bytes:
+                return
+            while self.bytes + size > self.max_bytes:
+                self.remove(next(iter(self.entries)))
+                self.counts['evictions'] += 1
+            self.entries[Key] = (Expires, size, Value)
+            self.bytes += size
+
+    # remove an entry from the memory tier, the lock must be held
+    def remove(self, Key):
+        expires, size, value = self.entries.pop(Key)
+        self.bytes -= size
+
+    # empty the cache, including the disk tier
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+        if self.disk:
+            self.disk.clear()
+
+    # statistics of how well the cache is working
+    def stats(self):
+        with self.lock:
+            return dict(self.counts, bytes=self.bytes, entries=len(self.entries), max_bytes=self.max_bytes)
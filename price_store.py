@@ -0,0 +1,133 @@
+# columnar on-disk store for the price history of each ticker
+# each ticker is a directory of numpy files that are memory mapped when they are read so loading them doesn't copy the data
+# libraries
+import os
+import time
+import uuid
+import numpy as np
+from urllib.parse import quote
+
+# the columns that are kept for each ticker, the rest of the yahoo finance columns are not used by the model
+columns = ['date', 'open', 'dividends']
+# the precomputed views, the rows of the first of each month and the rows dividends were distributed on
+views = ['month_start', 'dividend_rows']
+# how long the files of a generation that never became current are kept, another writer may still be writing them
+abandoned_seconds = 600
+
+# function to turn a yahoo finance history dataframe into the columns we store
+def columnsFromFrame (Ticker_data):
+    # a ticker that doesn't exist comes back without any rows
+    if 'Date' not in Ticker_data or len(Ticker_data) == 0:
+        return {'date': np.array([], dtype='datetime64[D]'), 'open': np.array([]), 'dividends': np.array([])}
+    dates = Ticker_data['Date']
+    # yahoo finance gives the dates in the timezone of the exchange, keep the local day
+    if getattr(dates.dt, 'tz', None) is not None:
+        dates = dates.dt.tz_localize(None)
+    return {'date': dates.values.astype('datetime64[D]'),
+            'open': np.asarray(Ticker_data['Open'], dtype=np.float64),
+            'dividends': np.asarray(Ticker_data['Dividends'], dtype=np.float64)}
+
+# function to find the precomputed views for a set of columns
+def viewsFromColumns (Columns):
+    dates = Columns['date']
+    # the first of the month is when the day part of the date is 1
+    month_start = np.flatnonzero(dates == dates.astype('datetime64[M]').astype('datetime64[D]'))
+    # the rows dividends were distributed on
+    dividend_rows = np.flatnonzero(Columns['dividends'] != 0)
+    return {'month_start': month_start, 'dividend_rows': dividend_rows}
+
+# store of the columns of every ticker in a directory
+class PriceStore:
+    def __init__(self, Directory):
+        self.directory = Directory
+        os.makedirs(Directory, exist_ok=True)
+
+    # the directory that holds a ticker, the ticker is quoted so tickers like ^GSPC make valid names
+    def tickerDir(self, Ticker):
+        return os.path.join(self.directory, quote(Ticker, safe=''))
+
+    # find which generation of files is current for a ticker, returns None if the ticker isn't stored
+    def generation(self, Ticker):
+        try:
+            with open(os.path.join(self.tickerDir(Ticker), 'CURRENT')) as file:
+                return file.read().strip()
+        except OSError:
+            return None
+
+    # load the columns and views of a ticker as memory mapped arrays, returns None if the ticker isn't stored
+    def load(self, Ticker):
+        generation = self.generation(Ticker)
+        if generation is None:
+            return None
+        folder = self.tickerDir(Ticker)
+        try:
+            return {name: np.load(os.path.join(folder, f'{name}.{generation}.npy'), mmap_mode='r') for name in columns+views}
+        except (OSError, ValueError):
+            return None
+
+    # find when a ticker was last written to the store, returns None if the ticker isn't stored
+    def updated(self, Ticker):
+        try:
+            return os.path.getmtime(os.path.join(self.tickerDir(Ticker), 'CURRENT'))
+        except OSError:
+            return None
+
+    # find the last day stored for a ticker, returns None if the ticker isn't stored
+    def lastDate(self, Ticker):
+        stored = self.load(Ticker)
+        if stored is None or len(stored['date']) == 0:
+            return None
+        return stored['date'][-1]
+
+    # replace everything stored for a ticker
+    def write(self, Ticker, Columns):
+        folder = self.tickerDir(Ticker)
+        os.makedirs(folder, exist_ok=True)
+        old_generation = self.generation(Ticker)
+        # every writer gets its own generation, two workers refreshing the same ticker would otherwise swap each other's files
+        generation = uuid.uuid4().hex
+        # write the new generation of files next to the old ones
+        arrays = dict(Columns, **viewsFromColumns(Columns))
+        for name in columns+views:
+            temp_path = os.path.join(folder, f'{name}.{generation}.tmp')
+            with open(temp_path, 'wb') as file:
+                np.save(file, np.ascontiguousarray(arrays[name]))
+            os.replace(temp_path, os.path.join(folder, f'{name}.{generation}.npy'))
+        # switch readers over to the new files in one step, readers that already mapped the old files keep them
+        temp_path = os.path.join(folder, f'CURRENT.{generation}.tmp')
+        with open(temp_path, 'w') as file:
+            file.write(generation)
+        os.replace(temp_path, os.path.join(folder, 'CURRENT'))
+        self.removeOld(folder, old_generation, generation)
+        return self.load(Ticker)
+
+    # remove the old generation of files and the files of writers that lost the race to be current a while ago
+    def removeOld(self, Folder, Old_generation, Generation):
+        abandoned = time.time() - abandoned_seconds
+        for file_name in os.listdir(Folder):
+            parts = file_name.split('.')
+            if len(parts) != 3 or parts[2] != 'npy' or parts[1] == Generation:
+                continue
+            path = os.path.join(Folder, file_name)
+            try:
+                if parts[1] == Old_generation or os.path.getmtime(path) < abandoned:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    # add only the days that are newer than what is stored for a ticker
+    def append(self, Ticker, Columns):
+        stored = self.load(Ticker)
+        # the stored days can't be read, the caller has to fetch the whole history again
+        if stored is None:
+            return None
+        if len(stored['date']) == 0:
+            return self.write(Ticker, Columns)
+        # keep only the new days
+        new_rows = Columns['date'] > stored['date'][-1]
+        if not np.any(new_rows):
+            # mark the ticker as checked so it isn't fetched again until the next market close
+            os.utime(os.path.join(self.tickerDir(Ticker), 'CURRENT'))
+            return stored
+        combined = {name: np.concatenate((stored[name], Columns[name][new_rows])) for name in columns}
+        return self.write(Ticker, combined)
@@ -0,0 +1,54 @@
+# shared fixtures for the tests, the model runs on a small seeded price history instead of yahoo finance
+# libraries
+import os
+import sys
+import zlib
+import numpy as np
+import pandas as pd
+import pytest
+
+# the modules are at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import investment_functions as inv
+from market_data import MarketDataProvider, dateRange, trimHistory
+
+# the fixture history ends in the middle of this year so the results don't depend on today's date
+fixture_year = 2025
+
+# function to make a seeded daily price history for a ticker, the same ticker always gets the same history
+def fixtureHistory (Ticker):
+    rng = np.random.default_rng(zlib.crc32(Ticker.encode()))
+    dates = pd.bdate_range('1990-01-01', f'{fixture_year}-06-30', tz='America/New_York')
+    # the market is closed on new years day
+    dates = dates[~((dates.month == 1) & (dates.day == 1))]
+    opens = 20*np.exp(np.cumsum(rng.normal(0.0003, 0.01, len(dates))))
+    # a dividend on the first trading day after the 15th of every third month
+    dividends = np.zeros(len(dates))
+    quarter = np.flatnonzero((dates.month % 3 == 0) & (dates.day >= 15))
+    quarter = quarter[np.r_[True, np.diff(quarter) > 1]]
+    dividends[quarter] = rng.uniform(0.1, 0.5, len(quarter))
+    return pd.DataFrame({'Date': dates, 'Open': opens, 'Dividends': dividends, 'Stock Splits': 0.0})
+
+# provider that gives the fixture history
+class FixtureHistoryProvider(MarketDataProvider):
+    def history(self, Tickers, Start=None, End=None):
+        return {ticker: dateRange(trimHistory(fixtureHistory(ticker)), Start, End) for ticker in Tickers}
+
+# use the fixture history with empty caches
+@pytest.fixture
+def fixture_prices(monkeypatch):
+    monkeypatch.setattr(inv, 'provider', FixtureHistoryProvider())
+    monkeypatch.setattr(inv, 'year', fixture_year)
+    monkeypatch.setattr(inv, 'price_store', None)
+    monkeypatch.setattr(inv, 'projection_cache', inv.ProjectionCache(1024))
+    inv.price_cache.clear()
+    yield
+    inv.price_cache.clear()
+
+# a portfolio of a few of the fixture tickers
+@pytest.fixture
+def portfolio():
+    return pd.DataFrame({'ticker': ['AAA', 'BBB', 'CCC'],
+                         'quantity': [16.81, 18.957, 11.455],
+                         'future_percents': [50, 30, 20]})
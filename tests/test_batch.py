@@ -0,0 +1,63 @@
+# tests for the headless batch runs
+# libraries
+import json
+import numpy as np
+import pandas as pd
+import pytest
+import batch
+import investment_functions as inv
+
+holdings = [{'ticker': 'AAA', 'quantity': 10, 'future_percents': 60}, {'ticker': 'BBB', 'quantity': 5, 'future_percents': 40}]
+
+def runBatch (Portfolios, Path):
+    input_path = Path/'portfolios.jsonl'
+    input_path.write_text('\n'.join(json.dumps(portfolio) for portfolio in Portfolios))
+    batch.evaluateBatch(batch.readPortfolios(str(input_path)), str(Path/'results.csv'))
+    return pd.read_csv(Path/'results.csv')
+
+# the batch gives the same worth as the dashboard
+def test_batch_matches_amount_per_year(fixture_prices, tmp_path):
+    results = runBatch([{'id': 'a', 'holdings': holdings, 'scenarios': [{'monthly': 500, 'years': 30}]}], tmp_path)
+    expected = inv.amountPeryear(pd.DataFrame(holdings), 500, 30)
+    np.testing.assert_allclose(results['amount'], expected['Amount'], rtol=1e-10)
+
+# a zero year scenario is only the current worth, a scenario that can't be run doesn't drop the rest of the portfolio
+# and a portfolio that can't be run, here one without a quantity, is left out
+def test_batch_keeps_the_scenarios_that_can_be_run(fixture_prices, tmp_path):
+    scenarios = [{'monthly': 500, 'years': 10}, {'monthly': 0, 'years': 0}, {'monthly': 100, 'years': 'ten'}]
+    results = runBatch([{'id': 'a', 'holdings': holdings, 'scenarios': scenarios},
+                        {'id': 'b', 'holdings': [{'ticker': 'CCC', 'future_percents': 100}], 'scenarios': scenarios}], tmp_path)
+    assert results.groupby('years').size().to_dict() == {0: 1, 10: 11}
+    assert set(results['id']) == {'a'}
+    zero_years = results[results['years'] == 0].iloc[0]
+    assert zero_years['amount'] == inv.currentPortfolioWorth(pd.DataFrame(holdings))
+
+# the parquet file has one row group for each chunk of portfolios, not one for each scenario
+def test_parquet_row_group_per_chunk(fixture_prices, tmp_path):
+    parquet = pytest.importorskip('pyarrow.parquet')
+    portfolios = [{'id': f'p{i}', 'holdings': holdings, 'scenarios': [{'monthly': 500, 'years': 10}, {'monthly': 100, 'years': 5}]}
+                  for i in range(3)]
+    batch.evaluateBatch(iter(portfolios), str(tmp_path/'results.parquet'), Format='parquet', Chunk_size=2)
+    results = parquet.ParquetFile(str(tmp_path/'results.parquet'))
+    assert results.metadata.num_row_groups == 2
+    assert results.metadata.num_rows == 3*(11+6)
+    table = results.read().to_pandas()
+    assert list(table.columns) == batch.output_columns
+    assert table[table['id'] == 'p0']['year'].tolist() == list(range(11)) + list(range(6))
+
+# records that are missing something are left out and the rest of the file is still run
+def test_batch_skips_malformed_records(fixture_prices, tmp_path):
+    scenarios = [{'monthly': 500, 'years': 5}]
+    results = runBatch([{'id': 'no-scenarios', 'holdings': holdings},
+                        {'holdings': holdings, 'scenarios': scenarios},
+                        {'id': 'no-ticker', 'holdings': [{'quantity': 10, 'future_percents': 100}], 'scenarios': scenarios},
+                        ['not', 'a', 'portfolio'],
+                        {'id': 'a', 'holdings': holdings, 'scenarios': scenarios}], tmp_path)
+    assert set(results['id']) == {'a'}
+    assert len(results) == 6
+
+# a portfolio without holdings still has a row for every year of the plan
+def test_batch_empty_holdings_has_every_year(fixture_prices, tmp_path):
+    results = runBatch([{'id': 'empty', 'holdings': [], 'scenarios': [{'monthly': 500, 'years': 5}]}], tmp_path)
+    assert results['year'].tolist() == list(range(6))
+    assert (results['amount'] == 0).all()
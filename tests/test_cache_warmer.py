@@ -0,0 +1,63 @@
+# tests for the background cache warmer
+# libraries
+import json
+import time
+from collections import Counter
+from cache_warmer import CacheWarmer
+
+# fake data source that records the tickers it was asked to load
+class FakeWarm:
+    def __init__(self, Error=None):
+        self.error = Error
+        self.calls = []
+
+    def __call__(self, Tickers):
+        self.calls.append(list(Tickers))
+        if self.error is not None:
+            raise self.error
+
+# the next refresh is far away so the warmer only warms once
+def farAway ():
+    return time.time() + 3600
+
+def test_warmer_is_ready_after_the_first_warm_up():
+    warm = FakeWarm()
+    warmer = CacheWarmer(warm, ['AAA', 'BBB'], Next_refresh=farAway)
+    assert not warmer.status()['ready']
+    warmer.start()
+    try:
+        assert warmer.wait(5)
+    finally:
+        warmer.stop()
+    assert warm.calls == [['AAA', 'BBB']]
+    assert warmer.status()['ready'] and warmer.last_warm is not None
+
+# the starter tickers come first, then the most requested tickers that aren't already starters
+def test_starter_tickers_come_before_popular_ones():
+    warmer = CacheWarmer(FakeWarm(), ['AAA', 'BBB'], Top_n=2, Next_refresh=farAway)
+    warmer.record(['ZZZ', 'YYY', 'ZZZ', 'BBB', 'BBB', 'BBB', '', None, 'XXX'])
+    assert warmer.tickers() == ['AAA', 'BBB', 'ZZZ']
+
+# the counts of every worker are added to the saved counts
+def test_save_counts_merges_with_the_saved_counts(tmp_path):
+    popular_file = tmp_path/'popular.json'
+    popular_file.write_text(json.dumps({'AAA': 3, 'BBB': 1}))
+    warmer = CacheWarmer(FakeWarm(), [], Popular_file=str(popular_file), Next_refresh=farAway)
+    warmer.record(['BBB', 'CCC'])
+    warmer.saveCounts()
+    assert json.loads(popular_file.read_text()) == {'AAA': 3, 'BBB': 2, 'CCC': 1}
+    assert warmer.counts == Counter()
+
+# a warm up that fails still lets the worker start, the next refresh tries again
+def test_failed_warm_up_still_sets_ready():
+    warm = FakeWarm(Error=ConnectionError('no connection'))
+    warmer = CacheWarmer(warm, ['AAA'], Next_refresh=farAway)
+    warmer.record(['BBB'])
+    warmer.start()
+    try:
+        assert warmer.wait(5)
+    finally:
+        warmer.stop()
+    assert warm.calls == [['AAA', 'BBB']]
+    # the counts are kept for the next warm up
+    assert warmer.counts == Counter({'BBB': 1})
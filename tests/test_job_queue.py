@@ -0,0 +1,71 @@
+# tests for the background job manager, the jobs are a stub that only sleeps
+# libraries
+import os
+import time
+import pytest
+
+pytest.importorskip('diskcache')
+pytest.importorskip('multiprocess')
+pytest.importorskip('psutil')
+
+import job_queue
+from job_queue import ProjectionJobManager
+
+# stub for the job of a background callback, it sleeps for as many seconds as it was given
+def sleepingJob (key, progress_key, args, context):
+    time.sleep(args)
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = ProjectionJobManager(str(tmp_path))
+    yield manager
+    manager.handle.close()
+
+def watchers (Manager, Job):
+    return Manager.handle.get(Manager.watchersKey(Job))
+
+# a second submission with the same inputs is attached to the running job, the job keeps running until both let go of it
+def test_submissions_share_a_running_job(manager):
+    job = manager.call_job_fn('inputs', sleepingJob, 30, {})
+    try:
+        assert manager.job_running(job)
+        assert manager.call_job_fn('inputs', sleepingJob, 30, {}) == job
+        assert watchers(manager, job) == 2
+        manager.terminate_job(job)
+        assert watchers(manager, job) == 1
+        assert manager.job_running(job)
+        manager.terminate_job(job)
+        assert watchers(manager, job) is None
+        assert not manager.job_running(job)
+    finally:
+        job_queue.DiskcacheManager.terminate_job(manager, job)
+
+# a cached result is served without starting a process
+def test_cached_result_doesnt_start_a_job(manager):
+    manager.handle.set('inputs', 'result')
+    assert manager.call_job_fn('inputs', sleepingJob, 30, {}) == 0
+
+# a failed job isn't cached so the next submission runs it again
+def test_failed_result_is_cleared(manager):
+    manager.handle.set('inputs', {'background_callback_error': {'msg': 'failed'}})
+    assert manager.get_result('inputs', None) == {'background_callback_error': {'msg': 'failed'}}
+    assert not manager.result_ready('inputs')
+    manager.handle.set('other', 'result')
+    assert manager.get_result('other', None) == 'result'
+    assert manager.result_ready('other')
+
+# a submission waits while another worker starts the job, if that worker never finishes starting it the inputs are freed
+def test_waits_for_a_job_that_is_starting(manager):
+    manager.handle.set(manager.jobKey('inputs'), job_queue.starting, expire=0.3)
+    start = time.perf_counter()
+    job = manager.call_job_fn('inputs', sleepingJob, 0, {})
+    assert time.perf_counter() - start >= 0.25
+    assert job > 0 and manager.handle.get(manager.jobKey('inputs')) == job
+    assert watchers(manager, job) == 1
+
+# the page loads without a monthly investment or years, so the Submit callback only runs when it is clicked
+def test_submit_does_not_run_on_page_load():
+    os.environ.setdefault('CACHE_WARMER_ENABLED', '0')
+    import app
+    submit = [callback for callback in app.app._callback_list if 'growth-predictions' in callback['output']]
+    assert len(submit) == 1 and submit[0]['prevent_initial_call']
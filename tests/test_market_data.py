@@ -0,0 +1,67 @@
+# tests for the market data providers
+# libraries
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import investment_functions as inv
+import market_data
+from conftest import FixtureHistoryProvider
+from market_data import DirectoryProvider, FixtureProvider, YahooFinanceProvider, history_columns
+
+# a plain ohlcv file without dividends or splits is read as a history without any
+def test_directory_provider_reads_ohlcv_csv(tmp_path):
+    pd.DataFrame({'Date': ['2024-01-02', '2024-01-03', '2024-01-04'], 'Open': [10.0, 10.5, 11.0], 'High': [10.6, 11.0, 11.2],
+                  'Low': [9.8, 10.4, 10.9], 'Close': [10.5, 11.0, 11.1], 'Volume': [1000, 1200, 900]}).to_csv(tmp_path / 'AAA.csv', index=False)
+    history = DirectoryProvider(str(tmp_path)).history(['AAA'], Start='2024-01-03')['AAA']
+    assert list(history.columns) == history_columns
+    assert list(history['Open']) == [10.5, 11.0]
+    assert (history['Dividends'] == 0).all() and (history['Stock Splits'] == 0).all()
+
+# a file without the opening prices can't be used
+def test_directory_provider_needs_open(tmp_path):
+    pd.DataFrame({'Date': ['2024-01-02'], 'Close': [10.5]}).to_csv(tmp_path / 'AAA.csv', index=False)
+    with pytest.raises(ValueError, match='Open'):
+        DirectoryProvider(str(tmp_path)).history(['AAA'])
+
+# record what a source gives and replay it without the source, a ticker like ^GSPC is quoted in the file name
+def test_fixture_provider_records_and_replays(tmp_path):
+    source = FixtureHistoryProvider()
+    recorder = FixtureProvider(str(tmp_path), Record=True, Source=source)
+    recorder.history(['^GSPC'], Start='2024-01-01', End='2024-07-01')
+    # a later fetch of the new days is added to what was recorded
+    recorder.history(['^GSPC'], Start='2024-07-01')
+    assert os.listdir(tmp_path) == ['%5EGSPC.csv']
+    replayed = FixtureProvider(str(tmp_path)).history(['^GSPC'], Start='2024-03-01', End='2025-02-01')['^GSPC']
+    expected = source.history(['^GSPC'], Start='2024-03-01', End='2025-02-01')['^GSPC']
+    assert list(replayed['Date']) == list(expected['Date'])
+    np.testing.assert_allclose(replayed['Open'], expected['Open'], rtol=1e-12)
+    np.testing.assert_allclose(replayed['Dividends'], expected['Dividends'], rtol=1e-12)
+
+# a ticker that wasn't recorded is an error, not a ticker without any history
+def test_unrecorded_ticker_is_an_error(tmp_path):
+    with pytest.raises(LookupError, match='AAA'):
+        FixtureProvider(str(tmp_path)).history(['AAA'])
+
+# stand in for yf.Ticker that keeps what history was called with
+class FakeYahooTicker:
+    calls = []
+
+    def __init__(self, Ticker):
+        self.ticker = Ticker
+
+    def history(self, **kwargs):
+        FakeYahooTicker.calls.append(kwargs)
+        dates = pd.DatetimeIndex(['2024-01-02', '2024-01-03'], tz='America/New_York', name='Date')
+        return pd.DataFrame({'Open': [10.0, 10.5], 'Close': [10.5, 11.0], 'Dividends': 0.0, 'Stock Splits': 0.0}, index=dates)
+
+# with a lookback only the years that are needed are asked for, without one the whole history is
+@pytest.mark.parametrize('lookback, expected', [(10, {'start': '2014-01-01', 'end': None}), (0, {'period': 'max'})])
+def test_yahoo_finance_asks_for_the_lookback(fixture_prices, monkeypatch, lookback, expected):
+    FakeYahooTicker.calls = []
+    monkeypatch.setattr(market_data.yf, 'Ticker', FakeYahooTicker)
+    monkeypatch.setattr(inv, 'provider', YahooFinanceProvider())
+    monkeypatch.setattr(inv, 'lookback_years', lookback)
+    history = inv.fetchHistory('AAA')
+    assert FakeYahooTicker.calls == [expected]
+    assert list(history.columns) == history_columns and len(history) == 2
@@ -0,0 +1,60 @@
+# tests for the timers and the /metrics text
+# libraries
+import contextlib
+import contextvars
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+
+# the histogram lines follow the prometheus text format, the buckets count every observation at or below their bound
+def test_histogram_lines():
+    histogram = metrics.Histogram('test_seconds', 'Time spent in a test.', 'stage')
+    histogram.observe('fetch', 0.02)
+    histogram.observe('fetch', 3.0)
+    lines = list(histogram.lines())
+    assert lines[:2] == ['# HELP test_seconds Time spent in a test.', '# TYPE test_seconds histogram']
+    assert 'test_seconds_bucket{stage="fetch",le="0.01"} 0' in lines
+    assert 'test_seconds_bucket{stage="fetch",le="0.025"} 1' in lines
+    assert 'test_seconds_bucket{stage="fetch",le="5.0"} 2' in lines
+    assert lines[-3:] == ['test_seconds_bucket{stage="fetch",le="+Inf"} 2', 'test_seconds_sum{stage="fetch"} 3.02',
+                          'test_seconds_count{stage="fetch"} 2']
+
+# the exposition has the histograms and the lines of every collector, and ends with a new line
+def test_exposition_includes_collectors(monkeypatch):
+    monkeypatch.setattr(metrics, 'collectors', [lambda: ['# TYPE test_total counter', 'test_total 7']])
+    metrics.record('exposition_test', 0.001)
+    text = metrics.exposition()
+    assert text.endswith('test_total 7\n')
+    assert '# TYPE portfolio_callback_seconds histogram' in text
+    assert 'portfolio_stage_seconds_count{stage="exposition_test"} 1' in text
+
+# the prefetch threads add their stages to the callback that started them, none of the times are lost
+# the threads switch as often as they can so an update that isn't locked can be lost
+def test_stages_from_many_threads_add_up(monkeypatch):
+    monkeypatch.setattr(metrics, 'stage_seconds', metrics.Histogram('test_seconds', 'Time spent in a test.', 'stage'))
+    @metrics.timedCallback('test_callback')
+    def callback():
+        def fetch():
+            for k in range(2000):
+                metrics.record('fetch', 1.0)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, fetch) for i in range(8)]
+        for future in futures:
+            future.result()
+        return dict(metrics.request_stages.get())
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        stages = callback()
+    finally:
+        sys.setswitchinterval(interval)
+    assert stages == {'fetch': 16000.0}
+
+# with METRICS_ENABLED=0 the functions aren't wrapped at all
+def test_disabled_metrics_return_the_function(monkeypatch):
+    monkeypatch.setattr(metrics, 'enabled', False)
+    def function():
+        return 1
+    assert metrics.timed('stage')(function) is function
+    assert metrics.timedCallback('callback')(function) is function
+    assert isinstance(metrics.timer('stage'), contextlib.nullcontext)
@@ -0,0 +1,166 @@
+# tests for the price cache
+# libraries
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from price_cache import DiskTier, PriceCache
+
+# an expired file is removed when it is read
+def test_disk_tier_removes_expired_file_on_get(tmp_path):
+    disk = DiskTier(str(tmp_path))
+    now = time.time()
+    disk.put('OLD', 1, now + 10)
+    assert disk.get('OLD', now) == (now + 10, 1)
+    assert disk.get('OLD', now + 20) is None
+    assert not os.path.exists(disk.path('OLD'))
+
+# files that are never read again, like typos, are swept once they expire
+def test_disk_tier_sweeps_expired_files(tmp_path):
+    disk = DiskTier(str(tmp_path))
+    now = time.time()
+    disk.put('TYPO', 1, now + 10)
+    disk.put('KEEP', 2, now + 100)
+    disk.sweep(now + 20)
+    assert sorted(os.listdir(tmp_path)) == ['KEEP.pkl']
+
+# fake data source that gives an array of 10 floats, 80 bytes, for every key and counts how often each key is loaded
+class CountingLoader:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, Key):
+        self.calls.append(Key)
+        return np.zeros(10)
+
+def smallCache (Loader, Expires=lambda Now: Now + 100, Disk_dir=None):
+    return PriceCache(Loader, Max_bytes=250, Disk_dir=Disk_dir, Expires=Expires)
+
+# the cache holds three entries, a fourth evicts the least recently used one
+def test_least_recently_used_entry_is_evicted():
+    loader = CountingLoader()
+    cache = smallCache(loader)
+    for key in ['A', 'B', 'C']:
+        cache.get(key)
+    cache.get('A')
+    cache.get('D')
+    assert list(cache.entries) == ['C', 'A', 'D']
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['bytes']) == (1, 4, 1, 240)
+    # the evicted key is loaded again
+    cache.get('B')
+    assert loader.calls == ['A', 'B', 'C', 'D', 'B']
+    assert cache.stats()['evictions'] == 2
+
+# an entry that has expired is loaded again
+def test_expired_entry_is_reloaded():
+    loader = CountingLoader()
+    cache = smallCache(loader, Expires=lambda Now: Now - 1)
+    cache.get('A')
+    cache.get('A')
+    assert loader.calls == ['A', 'A']
+    stats = cache.stats()
+    assert (stats['hits'], stats['expirations'], stats['entries']) == (0, 1, 1)
+
+# a value bigger than the whole cache is returned but not kept
+def test_value_bigger_than_the_cache_is_not_kept():
+    cache = PriceCache(lambda Key: np.zeros(100), Max_bytes=250, Expires=lambda Now: Now + 100)
+    assert len(cache.get('BIG')) == 100
+    assert cache.stats()['entries'] == 0 and cache.stats()['bytes'] == 0
+    cache.get('BIG')
+    assert cache.stats()['misses'] == 2
+
+# a worker that starts later finds what another worker loaded on the disk
+def test_disk_hit_warms_another_cache(tmp_path):
+    loader = CountingLoader()
+    first = smallCache(loader, Disk_dir=str(tmp_path))
+    second = smallCache(loader, Disk_dir=str(tmp_path))
+    first.get('A')
+    np.testing.assert_array_equal(second.get('A'), np.zeros(10))
+    assert loader.calls == ['A']
+    assert second.stats()['disk_hits'] == 1 and second.stats()['entries'] == 1
+    # after that the second cache has it in memory
+    second.get('A')
+    assert second.stats()['hits'] == 1
+
+# fake data source that takes a while to answer, like yahoo finance
+latency = 0.2
+
+class SlowLoader:
+    def __init__(self, Error=None):
+        self.error = Error
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, Key):
+        with self.lock:
+            self.calls.append(Key)
+        time.sleep(latency)
+        if self.error is not None:
+            raise self.error
+        return np.arange(10)
+
+def slowCache (Loader):
+    return PriceCache(Loader, Max_bytes=10**6, Expires=lambda Now: Now + 100)
+
+# the tickers are fetched at the same time, so loading many takes about as long as loading one
+def test_prefetch_loads_tickers_at_the_same_time():
+    loader = SlowLoader()
+    cache = slowCache(loader)
+    tickers = [f'T{i}' for i in range(8)]
+    start = time.perf_counter()
+    cache.prefetch(tickers, Max_workers=8)
+    assert time.perf_counter() - start < 3*latency
+    assert sorted(loader.calls) == sorted(tickers)
+    assert cache.stats()['entries'] == 8
+
+# two requests for the same ticker at the same time only fetch it once
+def test_concurrent_gets_share_one_load():
+    loader = SlowLoader()
+    cache = slowCache(loader)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        first = pool.submit(cache.get, 'AAA')
+        time.sleep(latency/4)
+        second = pool.submit(cache.get, 'AAA')
+        assert first.result() is second.result()
+    assert loader.calls == ['AAA']
+    assert cache.stats()['shared_loads'] == 1
+
+# a failed fetch is raised to everyone waiting on it and the next request tries again
+def test_load_error_reaches_every_waiter():
+    loader = SlowLoader(Error=ConnectionError('no connection'))
+    cache = slowCache(loader)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(cache.get, 'AAA')]
+        time.sleep(latency/4)
+        futures += [pool.submit(cache.get, 'AAA') for i in range(2)]
+        for future in futures:
+            with pytest.raises(ConnectionError):
+                future.result()
+    assert loader.calls == ['AAA']
+    assert cache.loading == {}
+    assert cache.stats()['entries'] == 0
+    with pytest.raises(ConnectionError):
+        cache.get('AAA')
+    assert loader.calls == ['AAA', 'AAA']
+
+# the workers share the disk tier, when they all miss a ticker at once only one of them fetches it and the others read what it wrote
+def test_workers_sharing_the_disk_fetch_once(tmp_path):
+    loader = SlowLoader()
+    workers = [PriceCache(loader, Max_bytes=10**6, Disk_dir=str(tmp_path), Expires=lambda Now: Now + 100) for i in range(3)]
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        values = list(pool.map(lambda cache: cache.get('AAA'), workers))
+    assert loader.calls == ['AAA']
+    assert all(np.array_equal(value, np.arange(10)) for value in values)
+    assert sum(cache.stats()['disk_hits'] for cache in workers) == 2
+
+# the lock files of keys that are no longer stored are swept with the expired files
+def test_disk_tier_sweeps_unused_lock_files(tmp_path):
+    disk = DiskTier(str(tmp_path))
+    now = time.time()
+    with disk.locked('TYPO'):
+        pass
+    disk.put('KEEP', 1, now + 100)
+    assert sorted(os.listdir(tmp_path)) == ['KEEP.pkl']
@@ -0,0 +1,87 @@
+# tests for loading the price history through the price store
+# libraries
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+import investment_functions as inv
+from price_store import PriceStore, columnsFromFrame, viewsFromColumns
+from conftest import FixtureHistoryProvider, fixtureHistory
+
+@pytest.fixture
+def store(fixture_prices, monkeypatch, tmp_path):
+    store = PriceStore(str(tmp_path))
+    monkeypatch.setattr(inv, 'price_store', store)
+    return store
+
+def expectedOpen (Ticker):
+    history = fixtureHistory(Ticker)
+    return history[history['Date'].dt.is_month_start]['Open'].values.astype(np.float32)
+
+# the stored files can't be read back after the last day was found, like when another worker swaps them at the same time
+@pytest.fixture
+def unreadable(store, monkeypatch):
+    inv.loadHistory('AAA')
+    last_date = store.lastDate('AAA')
+    monkeypatch.setattr(store, 'lastDate', lambda Ticker: last_date)
+    monkeypatch.setattr(store, 'load', lambda Ticker: None)
+    return store
+
+# a current history that can't be read is fetched again instead of failing
+def test_unreadable_current_history_is_fetched_again(unreadable):
+    np.testing.assert_array_equal(inv.loadHistory('AAA').month_open, expectedOpen('AAA'))
+
+# the same when the history is out of date and only the new days would have been added
+def test_unreadable_stale_history_is_fetched_again(unreadable):
+    os.utime(os.path.join(unreadable.tickerDir('AAA'), 'CURRENT'), (0, 0))
+    np.testing.assert_array_equal(inv.loadHistory('AAA').month_open, expectedOpen('AAA'))
+
+# a file that was cut short is replaced by the whole history
+def test_truncated_file_is_replaced(store):
+    inv.loadHistory('BBB')
+    with open(os.path.join(store.tickerDir('BBB'), f"open.{store.generation('BBB')}.npy"), 'r+b') as file:
+        file.truncate(64)
+    np.testing.assert_array_equal(inv.loadHistory('BBB').month_open, expectedOpen('BBB'))
+    assert store.load('BBB') is not None
+
+# provider whose history ends on a day that can be moved forward, like the days passing between refreshes
+class AdvancingProvider(FixtureHistoryProvider):
+    def __init__(self, End):
+        self.end = End
+        self.starts = []
+
+    def history(self, Tickers, Start=None, End=None):
+        self.starts.append(Start)
+        return super().history(Tickers, Start, End or self.end)
+
+# a stale history only gets the new days, and the appended history is the same as fetching the whole history
+def test_appended_history_matches_full_fetch(store, monkeypatch):
+    provider = AdvancingProvider('2025-04-01')
+    monkeypatch.setattr(inv, 'provider', provider)
+    inv.loadHistory('CCC')
+    old_generation = store.generation('CCC')
+    # the market closes through april and may, the new days don't have a dividend so they are appended
+    provider.end = '2025-06-01'
+    os.utime(os.path.join(store.tickerDir('CCC'), 'CURRENT'), (0, 0))
+    appended = inv.loadHistory('CCC')
+    assert provider.starts[-1] == '2025-04-01'
+    assert store.generation('CCC') != old_generation
+    monkeypatch.setattr(inv, 'price_store', None)
+    full = inv.loadHistory('CCC')
+    for name in ['month_dates', 'month_open', 'dividend_dates', 'dividend_amounts']:
+        np.testing.assert_array_equal(getattr(appended, name), getattr(full, name))
+    assert str(appended.month_dates[-1]) == '2025-05-01'
+
+# workers writing the same ticker at the same time each write their own generation, so what is current is one complete set
+def test_concurrent_writes_keep_one_complete_generation(store):
+    frames = [columnsFromFrame(fixtureHistory('AAA').iloc[:length]) for length in range(1000, 1800, 100)]
+    def writeMany(Columns):
+        for i in range(5):
+            store.write('AAA', Columns)
+    with ThreadPoolExecutor(max_workers=len(frames)) as pool:
+        list(pool.map(writeMany, frames))
+    stored = store.load('AAA')
+    assert len(stored['open']) == len(stored['date']) == len(stored['dividends'])
+    assert any(len(stored['date']) == len(columns['date']) for columns in frames)
+    np.testing.assert_array_equal(stored['month_start'], viewsFromColumns(stored)['month_start'])
+    np.testing.assert_array_equal(stored['dividend_rows'], viewsFromColumns(stored)['dividend_rows'])
@@ -0,0 +1,83 @@
+# the vectorized projection must give the same worth as the per month loop it replaced
+# libraries
+import os
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+import investment_functions as inv
+
+# the per month loop the model used before the projection was vectorized, kept as the reference
+def loopPrediction (Portfolio,Monthly_investments,Years_to_invest):
+    rows = []
+    for ticker, percent in zip(Portfolio['ticker'], Portfolio['future_percents']):
+        monthly_cost = inv.MonthlyCost(ticker)
+        percents = percent/100
+        principal = inv.calcCurrentWorth(Portfolio,ticker,monthly_cost)
+        months = Years_to_invest*12
+        monthly_contribution = percents*Monthly_investments
+        rows.append({'Month': 1, 'Amount': principal, 'Ticker': ticker})
+        if months < 2:
+            continue
+        interest = inv.interestRate(Years_to_invest,ticker)
+        dividends = inv.CalculateAvgDividend(ticker,Years_to_invest)
+        avg_cost_per_share = inv.CalculateAvgCostPerShare(Years_to_invest,ticker)
+        for i in range(2,months+1):
+            amt = rows[-1]['Amount']
+            if (i%3)==0:
+                total = amt+(amt*(interest/12))+monthly_contribution+((amt/avg_cost_per_share)*dividends)
+            else:
+                total = amt+(amt*(interest/12))+monthly_contribution
+            rows.append({'Month': i, 'Amount': total, 'Ticker': ticker})
+    return pd.DataFrame(rows, columns = ['Month', 'Amount', 'Ticker'])
+
+# the yearly sums of the per month loop
+def loopPerYear (Portfolio,Monthly_investments,Years_to_invest):
+    total_portfolio = loopPrediction(Portfolio,Monthly_investments,Years_to_invest)
+    amounts = [inv.currentPortfolioWorth(Portfolio)]
+    for i in range(1,Years_to_invest+1):
+        amounts.append(total_portfolio[total_portfolio['Month']==i*12]['Amount'].sum())
+    return pd.DataFrame({'Year': np.arange(0, Years_to_invest+1), 'Amount': amounts})
+
+@pytest.mark.parametrize('years', [0, 1, 2, 10, 30])
+def test_total_investment_prediction_matches_loop(fixture_prices, portfolio, years):
+    expected = loopPrediction(portfolio, 500, years)
+    result = inv.totalInvestmentPrediction(portfolio, 500, years)
+    assert list(result['Month']) == list(expected['Month'])
+    assert list(result['Ticker']) == list(expected['Ticker'])
+    np.testing.assert_allclose(result['Amount'], expected['Amount'], rtol=1e-9)
+
+@pytest.mark.parametrize('years', [0, 1, 2, 10, 30])
+def test_amount_per_year_matches_loop(fixture_prices, portfolio, years):
+    expected = loopPerYear(portfolio, 500, years)
+    result = inv.amountPeryear(portfolio, 500, years)
+    assert list(result['Year']) == list(expected['Year'])
+    np.testing.assert_allclose(result['Amount'], expected['Amount'], rtol=1e-9)
+
+# plans longer than the history use the same rates, so the longer plan continues the cached projection of the shorter one
+def test_resumed_projection_matches_loop(fixture_prices, portfolio):
+    inv.amountPeryear(portfolio, 500, 40)
+    expected = loopPerYear(portfolio, 500, 60)
+    np.testing.assert_allclose(inv.amountPeryear(portfolio, 500, 60)['Amount'], expected['Amount'], rtol=1e-9)
+
+# the statistics index keeps the dates of the history instead of its own copy, also after the history is pickled
+def test_stats_share_the_history_dates(fixture_prices):
+    history = inv.loadHistory('AAA')
+    for history in [history, pickle.loads(pickle.dumps(history))]:
+        assert history.stats.monthly_dates is history.month_dates
+        assert history.stats.dividend_dates is history.dividend_dates
+
+# the amount invested has a row for every year of the prediction, also for a plan of zero years
+@pytest.mark.parametrize('years', [0, 1, 5])
+def test_money_invested_has_every_year(fixture_prices, portfolio, years):
+    prediction = inv.compareInvestedtoGrowth(inv.amountPeryear(portfolio, 500, years), portfolio, 500, years)
+    worth = prediction['Amount'].values[0]
+    np.testing.assert_allclose(prediction['Money_Invested'], worth + 6000*np.arange(years+1))
+
+# Submit works for a plan of zero years, the worth is the current worth and nothing more is invested
+def test_submit_with_zero_years(fixture_prices, portfolio):
+    os.environ.setdefault('CACHE_WARMER_ENABLED', '0')
+    import app
+    worth, invested, growth, sweep = app.investmentPredictions(1, portfolio.to_dict('records'), 500, 0, [])
+    assert worth.split('$')[1] == invested.split('$')[1]
+    assert list(growth.data[0].x) == [0]
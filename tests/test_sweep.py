@@ -0,0 +1,47 @@
+# tests for the heatmap of the worth by monthly investment and years
+# libraries
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import investment_functions as inv
+from conftest import FixtureHistoryProvider
+
+# early in january the first price of the year isn't known yet, so there is no growth rate for a one year plan
+class JanuaryProvider(FixtureHistoryProvider):
+    def history(self, Tickers, Start=None, End=None):
+        return super().history(Tickers, Start, End or '2025-01-10')
+
+@pytest.fixture
+def january(fixture_prices, monkeypatch):
+    monkeypatch.setattr(inv, 'provider', JanuaryProvider())
+
+def test_sweep_leaves_out_plans_without_rates(january, portfolio):
+    grid = inv.sweepGrid(portfolio, [0, 500], range(1, 6))
+    assert grid.loc[1].isna().all()
+    assert np.isfinite(grid.loc[2:].values).all()
+
+# the growth of the plan is still shown when the heatmap can't be made
+def test_prediction_does_not_depend_on_the_heatmap(january, portfolio, monkeypatch):
+    os.environ.setdefault('CACHE_WARMER_ENABLED', '0')
+    import app
+    def failingGrid (*args):
+        raise RuntimeError('sweep failed')
+    monkeypatch.setattr(inv, 'sweepGrid', failingGrid)
+    worth, invested, growth, sweep = app.investmentPredictions(1, portfolio.to_dict('records'), 500, 30, [])
+    assert worth.startswith('Predicted Future Portfolio Worth: $')
+    assert len(growth.data) == 2
+    assert len(sweep.data) == 0
+
+# every cell of the grid is the worth at the end of the plan that amountPeryear finds for the same monthly investment and years
+def test_sweep_matches_amount_per_year(fixture_prices, portfolio):
+    years = [1, 2, 3, 7, 12, 25, 34, 35, 40]
+    grid = inv.sweepGrid(portfolio, [0, 250, 1000], years)
+    for plan_years in years:
+        for monthly in [0, 250, 1000]:
+            expected = inv.amountPeryear(portfolio, monthly, plan_years)['Amount'].values[-1]
+            np.testing.assert_allclose(grid.loc[plan_years, monthly], expected, rtol=1e-10)
+
+def test_sweep_of_an_empty_portfolio(fixture_prices):
+    grid = inv.sweepGrid(pd.DataFrame({'ticker': [], 'quantity': [], 'future_percents': []}), [0, 500], range(1, 4))
+    assert grid.shape == (3, 2) and (grid.values == 0).all()
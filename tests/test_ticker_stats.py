@@ -0,0 +1,59 @@
+# the statistics index must give the same averages as scanning the first of each month like the model did before the index
+# libraries
+import numpy as np
+import pandas as pd
+import pytest
+import investment_functions as inv
+from conftest import fixtureHistory, fixture_year
+from market_data import trimHistory
+from price_store import columnsFromFrame
+
+# a history that has a price and a dividend on new years day and the days after it, so the start of a lookback falls right next to them
+def januaryHistory ():
+    rng = np.random.default_rng(7)
+    dates = pd.bdate_range('1995-01-02', f'{fixture_year}-06-30')
+    opens = 50*np.exp(np.cumsum(rng.normal(0.0002, 0.01, len(dates))))
+    dividends = np.where((dates.month == 1) & (dates.day <= 3), rng.uniform(0.1, 0.5, len(dates)), 0.0)
+    return pd.DataFrame({'Date': dates, 'Open': opens, 'Dividends': dividends, 'Stock Splits': 0.0})
+
+# the start of the lookback, the years the user plans to invest or the first year there is, whichever is shorter
+def lookbackStart (First_year, Years_to_invest):
+    return pd.Timestamp(f'{fixture_year - min(fixture_year - First_year, Years_to_invest)}-01-01')
+
+# the average growth rate found by scanning back from december for the last month of each year with a price
+def scanGrowth (Monthly, Years_to_invest):
+    years = min(fixture_year - (Monthly['Date'].iloc[0].year + 1), Years_to_invest)
+    rates = []
+    for i in range(years):
+        for month in range(12, 0, -1):
+            new_value = Monthly[Monthly['Date'] == pd.Timestamp(fixture_year-i, month, 1)]
+            if len(new_value):
+                break
+        for older_month in range(month, 0, -1):
+            old_value = Monthly[Monthly['Date'] == pd.Timestamp(fixture_year-i-1, older_month, 1)]
+            if len(old_value):
+                break
+        rates.append(new_value['Open'].values[0]/old_value['Open'].values[0] - 1)
+    return sum(rates)/years
+
+# the average dividend of the dividends after the start of the lookback
+def scanDividend (Dividends, Years_to_invest):
+    start = lookbackStart(Dividends['Date'].iloc[0].year, Years_to_invest)
+    return Dividends[Dividends['Date'] > start]['Dividends'].mean()
+
+# the average cost per share of the first of each month after the start of the lookback
+def scanCost (Monthly, Years_to_invest):
+    start = lookbackStart(Monthly['Date'].iloc[0].year, Years_to_invest)
+    return Monthly[Monthly['Date'] > start]['Open'].mean()
+
+@pytest.mark.parametrize('history', [fixtureHistory('AAA'), januaryHistory()], ids=['fixture', 'january'])
+@pytest.mark.parametrize('years', [1, 2, 5, 10, 29, 100])
+def test_stats_match_month_start_scan(fixture_prices, history, years):
+    frame = trimHistory(history)
+    monthly = frame[frame['Date'].dt.day == 1]
+    dividends = frame[frame['Dividends'] != 0]
+    stats = inv.PriceHistory(columnsFromFrame(frame)).stats
+    # the index keeps the cost per share as float32
+    np.testing.assert_allclose(stats.averageGrowth(years), scanGrowth(monthly, years), rtol=1e-5)
+    np.testing.assert_allclose(stats.averageDividend(years), scanDividend(dividends, years), rtol=1e-12)
+    np.testing.assert_allclose(stats.averageCost(years), scanCost(monthly, years), rtol=1e-6)
@@ -0,0 +1,152 @@
+# statistics index for the price history of a ticker
+# the index is built once when the history is loaded, then the averages for any number of years are found without scanning the history
+# libraries
+import numpy as np
+
+# prefix sums of a column, sums[k] is the sum of the first k values
+def prefixSums (Values):
+    return np.concatenate(([0.0], np.cumsum(Values, dtype=np.float64)))
+
+class TickerStats:
+    __slots__ = ('current_year', 'monthly_dates', 'open_sums', 'dividend_dates', 'dividend_sums', 'first_month_year', 'first_dividend_year',
+                 'current_cost', 'growth_years', 'growth_sums', 'growth_counts', 'first_return_month', 'monthly_returns')
+
+    def __init__(self, Monthly_dates, Monthly_open, Dividend_dates, Dividends, Current_year):
+        self.current_year = Current_year
+        # the cost per share on the first of each month, with prefix sums for the average cost
+        # the dates are kept without copying them when they are already days, the price history shares the same arrays
+        self.monthly_dates = np.asarray(Monthly_dates).astype('datetime64[D]', copy=False)
+        self.open_sums = prefixSums(Monthly_open)
+        # the dividends, with prefix sums for the average dividend
+        self.dividend_dates = np.asarray(Dividend_dates).astype('datetime64[D]', copy=False)
+        self.dividend_sums = prefixSums(Dividends)
+        # the first year of each of the histories
+        self.first_month_year = self.yearOf(self.monthly_dates[0]) if len(self.monthly_dates) else None
+        self.first_dividend_year = self.yearOf(self.dividend_dates[0]) if len(self.dividend_dates) else None
+        # the most recent cost per share
+        self.current_cost = float(Monthly_open[-1]) if len(Monthly_open) else None
+        # the growth rate of each year and prefix sums of them for the average annual growth rate
+        self.growth_years, growth_rates = self.yearlyGrowth(Monthly_open)
+        valid = ~np.isnan(growth_rates)
+        self.growth_sums = prefixSums(np.where(valid, growth_rates, 0.0))
+        self.growth_counts = np.concatenate(([0], np.cumsum(valid)))
+        # the return of every month, used to sample returns for the simulations
+        self.first_return_month, self.monthly_returns = self.monthlyReturnSeries(Monthly_open)
+
+    # the calendar year of a date
+    @staticmethod
+    def yearOf(Date):
+        return int(Date.astype('datetime64[Y]').astype(int)) + 1970
+
+    # the growth rate for every year from the first year of the history to the current year
+    # a year is compared using the last month of the year that has a price against the same month, or the closest month before it, of the year before
+    def yearlyGrowth(self, Monthly_open):
+        if self.first_month_year is None:
+            return np.array([], dtype=int), np.array([])
+        years = np.arange(self.first_month_year, max(self.current_year, self.yearOf(self.monthly_dates[-1]))+1)
+        # make a table of the cost per share with a row for each year and a column for each month, nan where there is no price
+        table = np.full((len(years), 12), np.nan)
+        row = self.monthly_dates.astype('datetime64[Y]').astype(int) + 1970 - years[0]
+        column = self.monthly_dates.astype('datetime64[M]').astype(int) % 12
+        table[row, column] = Monthly_open
+        # carry the last month with a price forward through the year so we can find the closest month at or before any month
+        month_number = np.where(np.isnan(table), -1, np.arange(12))
+        last_month = np.maximum.accumulate(month_number, axis=1)
+        last_open = np.take_along_axis(table, np.maximum(last_month, 0), axis=1)
+        last_open[last_month < 0] = np.nan
+        # the value at the end of each year and the month it came from
+        end_month = last_month[:, -1]
+        end_value = last_open[:, -1]
+        # the value of the year before at the same month, or the closest month before it
+        rates = np.full(len(years), np.nan)
+        has_month = end_month[1:] >= 0
+        previous_value = np.full(len(years)-1, np.nan)
+        previous_value[has_month] = last_open[:-1][has_month, end_month[1:][has_month]]
+        rates[1:] = end_value[1:]/previous_value - 1
+        return years, rates
+
+    # the return of every month from the second month of the history to the last, and the number of the first of those months
+    # months without a price on the first of the month are filled in with the same growth as the months around them
+    def monthlyReturnSeries(self, Monthly_open):
+        if len(self.monthly_dates) < 2:
+            return 0, np.array([])
+        # number the months since 1970 so months from different tickers line up
+        month_number = self.monthly_dates.astype('datetime64[M]').astype(int)
+        every_month = np.arange(month_number[0], month_number[-1]+1)
+        log_open = np.interp(every_month, month_number, np.log(np.asarray(Monthly_open, dtype=np.float64)))
+        return int(every_month[1]), np.expm1(np.diff(log_open))
+
+    # the monthly returns over the lookback and the months they happened in
+    def monthlyReturns(self, Years_to_invest):
+        if self.first_month_year is None:
+            raise IndexError('the ticker has no price history')
+        # the months are one after another so the months are found from the first one
+        start = max((self.startYear(self.first_month_year, Years_to_invest) - 1970)*12 - self.first_return_month, 0)
+        returns = self.monthly_returns[start:]
+        return np.arange(self.first_return_month+start, self.first_return_month+start+len(returns)), returns
+
+    # the first year of the lookback, either the number of years the user plans to invest or the first year the history has
+    # works for one number of years or an array of them
+    def startYear(self, First_year, Years_to_invest):
+        return self.current_year - np.minimum(self.current_year - First_year, Years_to_invest)
+
+    # the average dividend since the start of the lookback
+    def averageDividend(self, Years_to_invest):
+        if self.first_dividend_year is None:
+            raise IndexError('the ticker has no dividends')
+        return float(self.averageSince(self.dividend_dates, self.dividend_sums, self.startYear(self.first_dividend_year, Years_to_invest)))
+
+    # the average cost per share since the start of the lookback
+    def averageCost(self, Years_to_invest):
+        if self.first_month_year is None:
+            raise IndexError('the ticker has no price history')
+        return float(self.averageSince(self.monthly_dates, self.open_sums, self.startYear(self.first_month_year, Years_to_invest)))
+
+    # the average of the values after the first of january of a year, or of each of an array of years, nan if there are none
+    @staticmethod
+    def averageSince(Dates, Sums, Year):
+        start = np.searchsorted(Dates, (np.asarray(Year) - 1970).astype('datetime64[Y]').astype('datetime64[D]'), side='right')
+        count = len(Dates) - start
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(count > 0, (Sums[-1] - Sums[start])/count, np.nan)
+
+    # the average annual growth rate over the lookback, AAGR = (GR1 + GR2 + ... + GRN)/N
+    def averageGrowth(self, Years_to_invest):
+        if self.first_month_year is None:
+            raise IndexError('the ticker has no price history')
+        growth = float(self.averageGrowths(Years_to_invest))
+        if np.isnan(growth):
+            raise ZeroDivisionError('there is not a full year of history to find the growth rate')
+        return growth
+
+    # the average annual growth rate for one number of years or an array of them, nan where there is not a full year of history
+    def averageGrowths(self, Years_to_invest):
+        # the first year with a growth rate is the year after the history starts
+        years = np.minimum(self.current_year - (self.first_month_year + 1), Years_to_invest)
+        # the growth rates of the most recent years, the current year back
+        end = self.current_year - self.growth_years[0] + 1
+        start = end - np.maximum(years, 0)
+        count = self.growth_counts[end] - self.growth_counts[start]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth = np.where(count > 0, (self.growth_sums[end] - self.growth_sums[start])/count, np.nan)
+        # a history that doesn't reach the year before has no growth
+        return np.where(years < 0, 0.0, growth)
+
+    # the growth rate, average dividend and average cost per share for every number of years in an array, nan where one can't be found
+    def averages(self, Years_to_invest):
+        years = np.asarray(Years_to_invest)
+        missing = np.full(years.shape, np.nan)
+        if self.first_month_year is None:
+            return missing, missing, missing
+        growth = self.averageGrowths(years)
+        cost = self.averageSince(self.monthly_dates, self.open_sums, self.startYear(self.first_month_year, years))
+        if self.first_dividend_year is None:
+            return growth, missing, cost
+        return growth, self.averageSince(self.dividend_dates, self.dividend_sums, self.startYear(self.first_dividend_year, years)), cost
+
+    # how much memory the index uses
+    @property
+    def nbytes(self):
+        return int(self.monthly_dates.nbytes + self.open_sums.nbytes + self.dividend_dates.nbytes + self.dividend_sums.nbytes
+                   + self.growth_years.nbytes + self.growth_sums.nbytes + self.growth_counts.nbytes
+                   + self.monthly_returns.nbytes)